@@ -1,137 +1,2002 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import array
+import bisect
+import codecs
+import gzip
+import hashlib
+import heapq
+import itertools
 import json
+import math
+import os
+import signal
 from datetime import datetime
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import queue
+import random
+import re
+import sqlite3
 import sys
+import threading
+import time
+import zlib
 
 # ==================== YOUR MODEL CODE (FROM TKINTER) ====================
-print("\n" + "="*60)
-print("🏥 Loading AI Disease Prediction Model...")
-print("="*60)
+# ---------- Label mapping (YOUR CODE) ----------
+id2label = {
+    "LABEL_0": "Acne",
+    "LABEL_1": "AIDS",
+    "LABEL_2": "Alcoholic hepatitis",
+    "LABEL_3": "Allergy",
+    "LABEL_4": "Arthritis",
+    "LABEL_5": "Asthma",
+    "LABEL_6": "Bronchitis",
+    "LABEL_7": "Cervical Spondylosis",
+    "LABEL_8": "Chicken pox",
+    "LABEL_9": "Chronic cholestasis",
+    "LABEL_10": "Common Cold",
+    "LABEL_11": "COVID-19",
+    "LABEL_12": "Dengue",
+    "LABEL_13": "Diabetes",
+    "LABEL_14": "Drug Reaction",
+    "LABEL_15": "Fungal Infection",
+    "LABEL_16": "Gastroenteritis",
+    "LABEL_17": "GERD",
+    "LABEL_18": "Heart Attack",
+    "LABEL_19": "Hepatitis A",
+    "LABEL_20": "Hepatitis B",
+    "LABEL_21": "Hepatitis C",
+    "LABEL_22": "Hepatitis D",
+    "LABEL_23": "Hepatitis E",
+    "LABEL_24": "Hypertension",
+    "LABEL_25": "Hyperthyroidism",
+    "LABEL_26": "Hypoglycemia",
+    "LABEL_27": "Hypothyroidism",
+    "LABEL_28": "Impetigo",
+    "LABEL_29": "Jaundice",
+    "LABEL_30": "Malaria",
+    "LABEL_31": "Migraine",
+    "LABEL_32": "Osteoarthritis",
+    "LABEL_33": "Paralysis (Brain Hemorrhage)",
+    "LABEL_34": "Peptic ulcer disease",
+    "LABEL_35": "Pneumonia",
+    "LABEL_36": "Psoriasis",
+    "LABEL_37": "Tuberculosis",
+    "LABEL_38": "Typhoid",
+    "LABEL_39": "Urinary Tract Infection",
+    "LABEL_40": "Varicose veins"
+}
 
+# Disease names indexed by label id, so model outputs map to names with a
+# list index instead of building and looking up "LABEL_n" strings
+DISEASE_NAMES = [id2label[f"LABEL_{i}"] for i in range(len(id2label))]
+DEFAULT_TOP_K = 5
+
+model_name = "shanover/symps_disease_bert_v3_c41"
+
+# ---------- Model state ----------
+# The model is loaded by load_model(), normally on a background thread after
+# the server is already listening. Until it finishes, model_status is
+# 'loading' and prediction routes answer 503.
+model_status = 'loading'     # 'loading' -> 'ready' | 'failed'
+model_error = None
 model_loaded = False
+tokenizer = None
+model = None
 clf = None
+backend = None
+model_revision = None
 
-try:
-    from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
-    
-    # ---------- Label mapping (YOUR CODE) ----------
-    id2label = {
-        "LABEL_0": "Acne",
-        "LABEL_1": "AIDS",
-        "LABEL_2": "Alcoholic hepatitis",
-        "LABEL_3": "Allergy",
-        "LABEL_4": "Arthritis",
-        "LABEL_5": "Asthma",
-        "LABEL_6": "Bronchitis",
-        "LABEL_7": "Cervical Spondylosis",
-        "LABEL_8": "Chicken pox",
-        "LABEL_9": "Chronic cholestasis",
-        "LABEL_10": "Common Cold",
-        "LABEL_11": "COVID-19",
-        "LABEL_12": "Dengue",
-        "LABEL_13": "Diabetes",
-        "LABEL_14": "Drug Reaction",
-        "LABEL_15": "Fungal Infection",
-        "LABEL_16": "Gastroenteritis",
-        "LABEL_17": "GERD",
-        "LABEL_18": "Heart Attack",
-        "LABEL_19": "Hepatitis A",
-        "LABEL_20": "Hepatitis B",
-        "LABEL_21": "Hepatitis C",
-        "LABEL_22": "Hepatitis D",
-        "LABEL_23": "Hepatitis E",
-        "LABEL_24": "Hypertension",
-        "LABEL_25": "Hyperthyroidism",
-        "LABEL_26": "Hypoglycemia",
-        "LABEL_27": "Hypothyroidism",
-        "LABEL_28": "Impetigo",
-        "LABEL_29": "Jaundice",
-        "LABEL_30": "Malaria",
-        "LABEL_31": "Migraine",
-        "LABEL_32": "Osteoarthritis",
-        "LABEL_33": "Paralysis (Brain Hemorrhage)",
-        "LABEL_34": "Peptic ulcer disease",
-        "LABEL_35": "Pneumonia",
-        "LABEL_36": "Psoriasis",
-        "LABEL_37": "Tuberculosis",
-        "LABEL_38": "Typhoid",
-        "LABEL_39": "Urinary Tract Infection",
-        "LABEL_40": "Varicose veins"
-    }
+def load_model(compile_mode=None, warmup=False, precision='fp32', backend_name='pytorch'):
+    """
+    Import transformers and load the tokenizer, model and pipeline, then
+    create the inference backend the server will use.
+    The heavy imports live in here so importing this module stays fast.
+    With precision the model is converted, and with compile_mode / warmup
+    compiled and warmed up (see prepare_model), before it is reported ready.
+    """
+    global model_status, model_error, model_loaded, tokenizer, model, clf, backend, model_revision
     
-    # ---------- Load model (YOUR CODE) ----------
-    model_name = "shanover/symps_disease_bert_v3_c41"
+    print("\n" + "="*60)
+    print("🏥 Loading AI Disease Prediction Model...")
+    print("="*60)
     
-    print(f"Loading model: {model_name}")
-    print("This may take a few minutes on first run...")
-    print("Downloading model files from Hugging Face...")
+    try:
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+        configure_torch()
+        
+        # ---------- Load model (YOUR CODE) ----------
+        print(f"Loading model: {model_name}")
+        print("This may take a few minutes on first run...")
+        print("Downloading model files from Hugging Face...")
+        
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        print("✅ Tokenizer loaded")
+        
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model_revision = getattr(model.config, '_commit_hash', None) or model_name
+        print("✅ Model loaded")
+        
+        clf = pipeline("text-classification", model=model, tokenizer=tokenizer, top_k=None)
+        print("✅ Pipeline created")
+        
+        backend = make_backend(backend_name)
+        print(f"✅ Backend: {backend.name}")
+        
+        if backend.name != 'pytorch' and (compile_mode or precision != 'fp32'):
+            print(f"⚠️  --compile / --precision only apply to the pytorch backend, ignored for {backend.name}")
+            compile_mode, precision = None, 'fp32'
+        if precision != 'fp32':
+            print(f"⚙️  Switching model to {precision}...")
+            apply_precision(precision)
+        if compile_mode or warmup:
+            prepare_model(compile_mode, warmup)
+        # Only now: requests must never reach a half-converted or failed model
+        model_loaded = True
+        model_status = 'ready'
+        print("\n✅ MODEL READY - Website can now predict diseases!")
+        
+    except ImportError as e:
+        model_status = 'failed'
+        model_error = f"Missing libraries: {e}"
+        print(f"\n❌ Missing libraries: {e}")
+        print("\nPlease install:")
+        print("  pip install transformers torch")
+        
+    except Exception as e:
+        model_status = 'failed'
+        model_error = str(e)
+        print(f"\n❌ Error loading model: {e}")
+        import traceback
+        traceback.print_exc()
     
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    print("✅ Tokenizer loaded")
+    print("="*60 + "\n")
+    return model_loaded
+
+def load_stub_model():
+    """
+    Load the offline stand-in model (no transformers, no download) that
+    bench.py measures the server with. Its scores are fake, so the server
+    itself never offers it.
+    """
+    global model_status, model_loaded, tokenizer, backend, model_revision
     
-    model = AutoModelForSequenceClassification.from_pretrained(model_name)
-    print("✅ Model loaded")
+    tokenizer = StubTokenizer()
+    backend = StubBackend()
+    model_revision = 'stub'
+    model_loaded = True
+    model_status = 'ready'
+    print("✅ Stub model ready (deterministic fake scores, NOT for real predictions)")
+    return model_loaded
+
+def load_model_in_background(compile_mode=None, warmup=False, precision='fp32', backend_name='pytorch'):
+    thread = threading.Thread(target=load_model, args=(compile_mode, warmup, precision, backend_name),
+                              name='model-loader', daemon=True)
+    thread.start()
+    return thread
+
+# ==================== THREADS & CPU AFFINITY ====================
+# Left alone, every server process starts one torch thread per core, so a
+# few processes on one host oversubscribe the cores and thrash. These are
+# normally filled in from the file autotune.py writes (--tuning).
+TUNING_FILE = 'tuning.json'
+TORCH_THREADS = None          # intra-op threads per process (None = torch default)
+TORCH_INTEROP_THREADS = None
+WORKER_CPUS = None            # one CPU list per worker process (or one for a single process)
+
+def load_tuning(path):
+    """
+    Read a tuning file written by autotune.py; None if there is none
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def configure_torch(threads=None):
+    """
+    Apply the thread settings to torch. Called once torch is imported.
+    """
+    import torch
+    
+    threads = threads or TORCH_THREADS
+    if threads:
+        torch.set_num_threads(threads)
+    if TORCH_INTEROP_THREADS:
+        try:
+            torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+        except RuntimeError:
+            # Can only be set once, before any inter-op work; keep what is set
+            pass
+
+def pin_to_cpus(cpus):
+    """
+    Restrict this process to the given CPUs (Linux only; ignored elsewhere)
+    """
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+
+# ==================== METRICS ====================
+# Counters and fixed-bucket histograms, served in Prometheus text format at
+# GET /metrics. Recording is a perf_counter() pair, a bisect and a few adds
+# under a lock, so it stays on under full load. In pre-fork mode every
+# worker keeps its own metrics; series carry a pid label to keep them apart.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_STAGES = ('parse', 'tokenize', 'forward', 'postprocess', 'send_json', 'send_binary')
+METRIC_PATHS = ('/', '/predict', '/predict/batch', '/history', '/history/stream', '/labels', '/static', '/stats', '/metrics', '/healthz', '/readyz')
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
     
-    clf = pipeline("text-classification", model=model, tokenizer=tokenizer, top_k=None)
-    print("✅ Pipeline created")
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
     
-    model_loaded = True
-    print("\n✅ MODEL READY - Website can now predict diseases!")
+    def render(self, name, labels):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {total}')
+        lines.append(f'{name}_count{{{labels}}} {cumulative}')
+        return lines
+
+class Metrics:
+    def __init__(self):
+        self.stages = {stage: Histogram() for stage in METRIC_STAGES}
+        self.request_latency = {}     # path -> Histogram
+        self.requests = {}            # (path, status) -> count
+        self.in_flight = 0
+        self.lock = threading.Lock()
+    
+    def observe(self, stage, seconds):
+        self.stages[stage].observe(seconds)
+    
+    def request_started(self):
+        with self.lock:
+            self.in_flight += 1
+    
+    def request_finished(self, path, status, seconds):
+        # Unknown paths share one label so scanners cannot blow up the series count
+        if path.startswith('/static/'):
+            path = '/static'
+        path = path if path in METRIC_PATHS else 'other'
+        with self.lock:
+            self.in_flight -= 1
+            self.requests[(path, status)] = self.requests.get((path, status), 0) + 1
+            histogram = self.request_latency.get(path)
+            if histogram is None:
+                histogram = self.request_latency[path] = Histogram()
+        histogram.observe(seconds)
     
-except ImportError as e:
-    print(f"\n❌ Missing libraries: {e}")
-    print("\nPlease install:")
-    print("  pip install transformers torch")
+    def render(self):
+        pid = f'pid="{os.getpid()}"'
+        with self.lock:
+            requests = dict(self.requests)
+            in_flight = self.in_flight
+            latency = dict(self.request_latency)
+        
+        lines = ['# HELP health_requests_total HTTP requests by path and status',
+                 '# TYPE health_requests_total counter']
+        for (path, status), count in sorted(requests.items()):
+            lines.append(f'health_requests_total{{{pid},path="{path}",status="{status}"}} {count}')
+        
+        lines += ['# HELP health_request_errors_total HTTP requests answered with a 4xx/5xx status',
+                  '# TYPE health_request_errors_total counter']
+        errors = {}
+        for (path, status), count in requests.items():
+            if status >= 400:
+                errors[path] = errors.get(path, 0) + count
+        for path, count in sorted(errors.items()):
+            lines.append(f'health_request_errors_total{{{pid},path="{path}"}} {count}')
+        
+        lines += ['# HELP health_requests_in_flight Requests currently being handled',
+                  '# TYPE health_requests_in_flight gauge',
+                  f'health_requests_in_flight{{{pid}}} {in_flight}',
+                  '# HELP health_inference_queue_depth Requests waiting for the micro-batcher',
+                  '# TYPE health_inference_queue_depth gauge',
+                  f'health_inference_queue_depth{{{pid}}} {batcher.queue.qsize()}',
+                  '# HELP health_model_ready 1 once the model can serve predictions',
+                  '# TYPE health_model_ready gauge',
+                  f'health_model_ready{{{pid}}} {int(model_status == "ready")}']
+        
+        lines += ['# HELP health_request_seconds Time to handle a request, by path',
+                  '# TYPE health_request_seconds histogram']
+        for path, histogram in sorted(latency.items()):
+            lines += histogram.render('health_request_seconds', f'{pid},path="{path}"')
+        
+        lines += ['# HELP health_client_requests_total /predict and /predict/batch requests by API client',
+                  '# TYPE health_client_requests_total counter']
+        clients = all_clients()
+        for client in clients:
+            lines.append(f'health_client_requests_total{{{pid},client="{client.name}",class="{client.priority}"}} {client.requests}')
+        lines += ['# HELP health_client_rate_limited_total Requests refused by the client\'s rate limit',
+                  '# TYPE health_client_rate_limited_total counter']
+        for client in clients:
+            lines.append(f'health_client_rate_limited_total{{{pid},client="{client.name}"}} {client.rate_limited}')
+        lines += ['# HELP health_client_queued Texts the client has waiting for the model',
+                  '# TYPE health_client_queued gauge']
+        for client in clients:
+            lines.append(f'health_client_queued{{{pid},client="{client.name}"}} {client.queued}')
+        lines += ['# HELP health_client_request_seconds /predict latency by API client',
+                  '# TYPE health_client_request_seconds histogram']
+        for client in clients:
+            lines += client.latency.render('health_client_request_seconds', f'{pid},client="{client.name}"')
+        
+        lines += ['# HELP health_stage_seconds Time spent in each stage of a prediction',
+                  '# TYPE health_stage_seconds histogram']
+        for stage, histogram in self.stages.items():
+            lines += histogram.render('health_stage_seconds', f'{pid},stage="{stage}"')
+        
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+# ==================== PROFILING ====================
+# A /predict call is profiled when it is sampled (PROFILE_SAMPLE_RATE) or
+# carries "X-Profile: <PROFILE_TOKEN>". Both are off by default, and when
+# they are the only cost is the check in should_profile(). The torch
+# profiler is process-global, so one profile runs at a time per process.
+PROFILE_DIR = 'profiles'
+PROFILE_SAMPLE_RATE = 0.0     # fraction of /predict requests to profile
+PROFILE_TOKEN = None          # secret that lets a client ask for a profile
+profile_ids = itertools.count(1)
+profile_lock = threading.Lock()
+
+class ProfileBusy(Exception):
+    """
+    Another request is being profiled in this process
+    """
+
+def should_profile(headers):
+    """
+    'requested' (X-Profile token), 'sampled' or None
+    """
+    if PROFILE_TOKEN and headers.get('X-Profile') == PROFILE_TOKEN:
+        return 'requested'
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return 'sampled'
+    return None
+
+def profile_prediction(symptoms_text, k=DEFAULT_TOP_K):
+    """
+    Run one prediction on the calling thread under cProfile and, for the
+    torch backends, the torch operator profiler. The cache and the
+    micro-batcher are skipped, so the cProfile stats hold only this
+    request; the torch trace is process-wide and also shows any forward
+    passes the batcher ran for other requests in the meantime.
+    Writes <id>.pstats, <id>.txt and (torch) <id>.trace.json and
+    <id>.ops.txt to PROFILE_DIR. Returns (result, profile id); raises
+    ProfileBusy if a profile is already running.
+    """
+    if not profile_lock.acquire(blocking=False):
+        raise ProfileBusy('Another request is being profiled, try again shortly')
+    try:
+        return _profile_prediction(symptoms_text, k)
+    finally:
+        profile_lock.release()
+
+def _profile_prediction(symptoms_text, k):
+    import cProfile
+    import io
+    import pstats
+    
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(profile_ids)}"
+    path = os.path.join(PROFILE_DIR, profile_id)
     
-except Exception as e:
-    print(f"\n❌ Error loading model: {e}")
-    import traceback
-    traceback.print_exc()
+    torch_profiler = None
+    if isinstance(backend, (PytorchBackend, PipelineBackend)):
+        import torch
+        torch_profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU],
+                                                record_shapes=True)
+    
+    profiler = cProfile.Profile()
+    if torch_profiler is not None:
+        torch_profiler.__enter__()
+    try:
+        profiler.enable()
+        try:
+            result = predict_diseases([symptoms_text], k)[0]
+        finally:
+            profiler.disable()
+    finally:
+        if torch_profiler is not None:
+            torch_profiler.__exit__(None, None, None)
+    
+    profiler.dump_stats(path + '.pstats')
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(40)
+    with open(path + '.txt', 'w') as f:
+        f.write(summary.getvalue())
+    
+    if torch_profiler is not None:
+        torch_profiler.export_chrome_trace(path + '.trace.json')
+        with open(path + '.ops.txt', 'w') as f:
+            f.write(torch_profiler.key_averages().table(sort_by='self_cpu_time_total', row_limit=40))
+    
+    print(f"🔬 Profile saved: {path}.*")
+    return result, profile_id
 
-print("="*60 + "\n")
+# ==================== INFERENCE BACKENDS ====================
+# Everything that runs the model goes through a backend: a batch of texts
+# goes in, and for every text the top k (label id, score) pairs come out,
+# best first. Label ids index DISEASE_NAMES.
+ONNX_DIR = 'onnx'
+
+class InferenceBackend:
+    name = None
+    
+    def predict(self, texts, k=DEFAULT_TOP_K):
+        raise NotImplementedError
+
+class PytorchBackend(InferenceBackend):
+    """
+    Lean eager PyTorch path: fast tokenizer -> model under inference_mode ->
+    softmax + topk on the logits tensor. Skips the pipeline's per-label
+    dicts and sorting. Uses clf.model, so precision and compile modes
+    apply here.
+    """
+    name = 'pytorch'
+    
+    def __init__(self):
+        import torch
+        self.torch = torch
+    
+    def predict(self, texts, k=DEFAULT_TOP_K):
+        torch = self.torch
+        started = time.perf_counter()
+        encoded = tokenizer(texts, padding=True, truncation=True, return_tensors='pt')
+        tokenized = time.perf_counter()
+        with torch.inference_mode():
+            logits = clf.model(**encoded)['logits']
+            scores, indices = torch.topk(logits.float().softmax(dim=-1), k, dim=-1)
+        outputs = [list(zip(i, s)) for i, s in zip(indices.tolist(), scores.tolist())]
+        metrics.observe('tokenize', tokenized - started)
+        metrics.observe('forward', time.perf_counter() - tokenized)
+        return outputs
 
-# Storage for prediction history
-prediction_history = []
+class PipelineBackend(InferenceBackend):
+    """
+    The original path through the transformers pipeline (clf), which scores
+    and sorts all 41 labels as dicts. Kept as a reference for the lean one.
+    """
+    name = 'pipeline'
+    
+    def predict(self, texts, k=DEFAULT_TOP_K):
+        # The pipeline tokenizes internally, so it is all counted as forward
+        started = time.perf_counter()
+        label2id = clf.model.config.label2id
+        results = clf(texts, batch_size=len(texts))
+        outputs = [[(label2id[item['label']], item['score']) for item in result[:k]] for result in results]
+        metrics.observe('forward', time.perf_counter() - started)
+        return outputs
+
+class OnnxBackend(InferenceBackend):
+    """
+    The same model exported to an ONNX graph and run by onnxruntime.
+    The export is cached under ONNX_DIR per model revision. The graph is
+    loaded once up front, so a missing onnxruntime or a broken export fails
+    at startup rather than on the first request.
+    """
+    name = 'onnx'
+    
+    def __init__(self, path=None):
+        import onnxruntime
+        
+        self.path = path or os.path.join(ONNX_DIR, f"{model_name.replace('/', '--')}-{model_revision}.onnx")
+        self.lock = threading.Lock()
+        if not os.path.exists(self.path):
+            self.export()
+        self.session = onnxruntime.InferenceSession(self.path, providers=['CPUExecutionProvider'])
+        self.session_pid = os.getpid()
+    
+    def export(self):
+        import torch
+        
+        print(f"📦 Exporting ONNX graph to {self.path}...")
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        example = tokenizer(['fever and cough', 'headache'], padding=True, return_tensors='pt')
+        # Export next to the final path and move it into place, so an
+        # interrupted export never leaves a truncated graph to be reused
+        partial = f"{self.path}.{os.getpid()}.tmp"
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'}
+                        for name in ('input_ids', 'attention_mask', 'token_type_ids')}
+        dynamic_axes['logits'] = {0: 'batch'}
+        
+        try:
+            with torch.no_grad():
+                torch.onnx.export(
+                    logits_only(model).eval(),
+                    (example['input_ids'], example['attention_mask'], example['token_type_ids']),
+                    partial,
+                    input_names=['input_ids', 'attention_mask', 'token_type_ids'],
+                    output_names=['logits'],
+                    dynamic_axes=dynamic_axes,
+                    opset_version=14
+                )
+            os.replace(partial, self.path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+    
+    def get_session(self):
+        # Re-created after a fork, so each pre-forked worker gets its own
+        # thread pool
+        with self.lock:
+            if self.session_pid != os.getpid():
+                import onnxruntime
+                self.session = onnxruntime.InferenceSession(self.path, providers=['CPUExecutionProvider'])
+                self.session_pid = os.getpid()
+            return self.session
+    
+    def predict(self, texts, k=DEFAULT_TOP_K):
+        import numpy as np
+        
+        started = time.perf_counter()
+        encoded = tokenizer(texts, padding=True, truncation=True, return_tensors='np')
+        feeds = {name: encoded[name].astype(np.int64)
+                 for name in ('input_ids', 'attention_mask', 'token_type_ids')}
+        tokenized = time.perf_counter()
+        logits = self.get_session().run(['logits'], feeds)[0]
+        
+        # Same softmax the pipeline applies for single-label classification
+        logits = logits - logits.max(axis=1, keepdims=True)
+        scores = np.exp(logits)
+        scores /= scores.sum(axis=1, keepdims=True)
+        
+        outputs = []
+        for row in scores:
+            top = np.argsort(-row)[:k]
+            outputs.append([(int(i), float(row[i])) for i in top])
+        metrics.observe('tokenize', tokenized - started)
+        metrics.observe('forward', time.perf_counter() - tokenized)
+        return outputs
+
+# ---------- Stub model ----------
+# A deterministic stand-in with the same 41 labels, so load tests and
+# benchmarks of everything around the model run offline and repeatably.
+# Loaded only by bench.py (load_stub_model), never by the server.
+STUB_BATCH_MS = 4.0          # simulated cost of one forward pass...
+STUB_TOKEN_MS = 0.02         # ...plus this per (padded) token in the batch
+
+class StubTokenizer:
+    """
+    Whitespace tokenizer with the subset of the transformers tokenizer
+    interface the server uses
+    """
+    def __call__(self, texts, truncation=False, add_special_tokens=True, return_offsets_mapping=False, **kwargs):
+        import re
+        
+        single = isinstance(texts, str)
+        encoded = {'input_ids': [], 'offset_mapping': []}
+        for text in [texts] if single else texts:
+            spans = [m.span() for m in re.finditer(r'\w+|[^\w\s]', text)]
+            ids = list(range(len(spans) + (2 if add_special_tokens else 0)))
+            encoded['input_ids'].append(ids[:512] if truncation else ids)
+            encoded['offset_mapping'].append(spans)
+        
+        if not return_offsets_mapping:
+            del encoded['offset_mapping']
+        if single:
+            encoded = {name: values[0] for name, values in encoded.items()}
+        return encoded
+
+class StubBackend(InferenceBackend):
+    """
+    Scores are a fixed function of the text; the forward pass is a sleep
+    that grows with the padded batch size, like the real model's cost does
+    """
+    name = 'stub'
+    
+    def predict(self, texts, k=DEFAULT_TOP_K):
+        import random
+        
+        started = time.perf_counter()
+        lengths = [min(512, len(ids)) for ids in tokenizer(texts)['input_ids']]
+        tokenized = time.perf_counter()
+        time.sleep((STUB_BATCH_MS + STUB_TOKEN_MS * max(lengths) * len(texts)) / 1000)
+        
+        outputs = []
+        for text in texts:
+            rng = random.Random(zlib.crc32(text.encode('utf-8')))
+            weights = [rng.random() ** 4 for _ in DISEASE_NAMES]
+            total = sum(weights)
+            ranked = sorted(range(len(weights)), key=weights.__getitem__, reverse=True)[:k]
+            outputs.append([(i, weights[i] / total) for i in ranked])
+        metrics.observe('tokenize', tokenized - started)
+        metrics.observe('forward', time.perf_counter() - tokenized)
+        return outputs
+
+BACKENDS = {
+    'pytorch': PytorchBackend,
+    'pipeline': PipelineBackend,
+    'onnx': OnnxBackend,
+}
+
+def make_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {tuple(BACKENDS)}")
+    return BACKENDS[name]()
+
+# The transformers pipeline is not thread-safe, so every call into the
+# backend (and the tokenizer) holds this
+clf_lock = threading.Lock()
+
+# ==================== PREDICTION HISTORY ====================
+# Entries are appended to a SQLite log by a background thread, so recording
+# never waits on the disk and history survives a restart. The log assigns
+# the ids (INTEGER PRIMARY KEY AUTOINCREMENT), so they are unique and
+# ordered across restarts and across pre-fork workers sharing the file.
+# Each process keeps the newest entries of the log in a bounded in-memory
+# ring, and /history and the streams are served from it; only pages older
+# than the ring go to the log. The ring pulls new entries from the log at
+# most every HISTORY_POLL_INTERVAL (and right after this process's writer
+# commits), so every worker shows the same history, another worker's entries
+# within HISTORY_POLL_INTERVAL. Without a log (--history-db "") the ring is
+# all there is, per process.
+HISTORY_MAX_ENTRIES = 1000    # newest entries kept in memory
+HISTORY_DB = 'history.db'     # append-only log (None = memory only)
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+HISTORY_QUEUE_SIZE = 10000    # entries waiting for the writer before new ones are dropped
+HISTORY_STREAM_MAX_CLIENTS = 64   # each open /history/stream holds a server thread
+HISTORY_STREAM_HEARTBEAT = 15     # seconds between keep-alive comments on an idle stream
+HISTORY_STREAM_RETRY_AFTER = 5    # Retry-After when every stream slot is taken
+HISTORY_POLL_INTERVAL = 0.5   # how often a stream checks the log for other workers' entries
+
+HISTORY_FIELDS = ('id', 'timestamp', 'symptoms', 'prediction', 'confidence')
+HISTORY_SELECT = 'SELECT id, timestamp, symptoms, prediction, confidence FROM history '
+
+class HistoryStore:
+    def __init__(self, max_entries=HISTORY_MAX_ENTRIES, path=None):
+        self.ring = deque(maxlen=max(1, max_entries))
+        self.path = path
+        self.lock = threading.Lock()
+        self.last_id = 0
+        self.pending = queue.Queue(HISTORY_QUEUE_SIZE)
+        self.writer_pid = None
+        self.changed = threading.Condition(self.lock)
+        self.sync_lock = threading.Lock()
+        self.synced_at = None
+        self.readers = threading.local()
+        self.streams = 0
+        self.written = 0
+        self.dropped = 0
+        
+        if path:
+            self._create()
+    
+    def _create(self):
+        """
+        Create the log once, before any worker is forked
+        """
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                       'timestamp TEXT, symptoms TEXT, prediction TEXT, confidence REAL)')
+            db.commit()
+        finally:
+            db.close()
+    
+    def _reader(self):
+        """
+        This thread's read connection to the log, opened on first use
+        """
+        reader = getattr(self.readers, 'db', None)
+        # A connection inherited across fork() must not be used
+        if reader is None or reader[0] != os.getpid():
+            reader = self.readers.db = (os.getpid(), sqlite3.connect(self.path, timeout=30))
+        return reader[1]
+    
+    def _query(self, sql, params):
+        return [dict(zip(HISTORY_FIELDS, row)) for row in self._reader().execute(HISTORY_SELECT + sql, params)]
+    
+    def _sync(self, force=False):
+        """
+        Pull entries logged since the last sync (by any process) into the
+        ring. Unless forced, the log is read at most every
+        HISTORY_POLL_INTERVAL, however many requests and streams ask.
+        """
+        def fresh():
+            return self.synced_at is not None and time.monotonic() - self.synced_at < HISTORY_POLL_INTERVAL
+        
+        if not self.path or (not force and fresh()):
+            return
+        with self.sync_lock:
+            if not force and fresh():
+                return
+            self.synced_at = time.monotonic()
+            # Newest first, so a long gap (or the first sync of a big log)
+            # loads only what fits
+            entries = self._query('WHERE id > ? ORDER BY id DESC LIMIT ?', (self.last_id, self.ring.maxlen))[::-1]
+            if entries:
+                with self.changed:
+                    self.ring.extend(entries)
+                    self.last_id = entries[-1]['id']
+                    self.changed.notify_all()
+    
+    def _floor(self):
+        """
+        Every entry with a larger id is in the ring (call with the lock held)
+        """
+        if len(self.ring) < self.ring.maxlen:
+            return 0
+        return self.ring[0]['id'] - 1
+    
+    def latest_id(self):
+        """
+        Id of the newest entry anyone has recorded (0 if there is none)
+        """
+        self._sync()
+        return self.last_id
+    
+    def record(self, entry):
+        if not self.path:
+            with self.lock:
+                self.last_id += 1
+                entry = dict(entry, id=self.last_id)
+                self.ring.append(entry)
+                self.changed.notify_all()
+            return entry
+        
+        # Started lazily so each pre-fork worker gets its own writer
+        if self.writer_pid != os.getpid():
+            self._start_writer()
+        entry = dict(entry)
+        try:
+            self.pending.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+        return entry
+    
+    def _start_writer(self):
+        with self.lock:
+            if self.writer_pid != os.getpid():
+                self.writer_pid = os.getpid()
+                threading.Thread(target=self._write, name='history-writer', daemon=True).start()
+    
+    def _write(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute('PRAGMA synchronous=NORMAL')
+        while True:
+            entries = [self.pending.get()]
+            while len(entries) < 500:
+                try:
+                    entries.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with db:
+                    for entry in entries:
+                        entry['id'] = db.execute(
+                            'INSERT INTO history (timestamp, symptoms, prediction, confidence) VALUES (?, ?, ?, ?)',
+                            tuple(entry[f] for f in HISTORY_FIELDS[1:])).lastrowid
+            except sqlite3.Error as e:
+                self.dropped += len(entries)
+                print(f"⚠️  History log write failed: {e}")
+                continue
+            self.written += len(entries)
+            try:
+                self._sync(force=True)
+            except sqlite3.Error as e:
+                print(f"⚠️  History log read failed: {e}")
+    
+    def page(self, cursor=None, since=None, limit=HISTORY_PAGE_SIZE):
+        """
+        One page of history, oldest entry first.
+        
+        since=<id>: up to `limit` entries newer than that id; poll again
+        with the returned 'latest' to get only what is new.
+        cursor=<id>: the newest `limit` entries older than that id, for
+        paging backwards; follow 'next_cursor' until it is None.
+        """
+        self._sync()
+        if since is not None:
+            with self.lock:
+                items = [e for e in self.ring if e['id'] > since][:limit]
+                in_ring = not self.path or since >= self._floor()
+            if not in_ring:
+                items = self._query('WHERE id > ? ORDER BY id LIMIT ?', (since, limit))
+            return {'history': items,
+                    'latest': items[-1]['id'] if items else since,
+                    'more': len(items) == limit}
+        
+        with self.lock:
+            items = [e for e in self.ring if cursor is None or e['id'] < cursor][-limit:]
+            in_ring = not self.path or len(items) == limit or self._floor() == 0
+            latest = self.last_id
+        if not in_ring:
+            if cursor is None:
+                items = self._query('ORDER BY id DESC LIMIT ?', (limit,))[::-1]
+            else:
+                items = self._query('WHERE id < ? ORDER BY id DESC LIMIT ?', (cursor, limit))[::-1]
+        return {'history': items,
+                'next_cursor': items[0]['id'] if len(items) == limit else None,
+                'latest': latest}
+    
+    def wait(self, since, timeout):
+        """
+        Block until an entry newer than `since` is recorded or `timeout`
+        passes. Returns True if there is something new.
+        """
+        if not self.path:
+            with self.changed:
+                return self.changed.wait_for(lambda: self.last_id > since, timeout)
+        
+        # This process's writer wakes us up; other workers' entries are
+        # only noticed by syncing with the log, which all streams share
+        deadline = time.monotonic() + timeout
+        while True:
+            self._sync()
+            with self.changed:
+                if self.last_id > since:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.changed.wait(min(remaining, HISTORY_POLL_INTERVAL))
+    
+    def open_stream(self):
+        with self.lock:
+            if self.streams >= HISTORY_STREAM_MAX_CLIENTS:
+                return False
+            self.streams += 1
+            return True
+    
+    def close_stream(self):
+        with self.lock:
+            self.streams -= 1
+    
+    def stats(self):
+        return {'in_memory': len(self.ring), 'max_in_memory': self.ring.maxlen, 'log': self.path,
+                'written': self.written, 'pending': self.pending.qsize(), 'dropped': self.dropped,
+                'streams': self.streams}
+
+history = HistoryStore()
+
+def parse_history_query(query):
+    """
+    cursor / since / limit from a /history query string. Raises ValueError
+    for anything that is not a sensible integer.
+    """
+    params = parse_qs(query)
+    values = {}
+    for name in ('cursor', 'since', 'limit'):
+        if name in params:
+            try:
+                values[name] = int(params[name][0])
+            except ValueError:
+                raise ValueError(f"'{name}' must be an integer")
+    if 'cursor' in values and 'since' in values:
+        raise ValueError("Use either 'cursor' or 'since', not both")
+    limit = values.get('limit', HISTORY_PAGE_SIZE)
+    if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+        raise ValueError(f"'limit' must be between 1 and {HISTORY_MAX_PAGE_SIZE}")
+    values['limit'] = limit
+    return values
+
+def record_prediction(symptoms, result):
+    return history.record({
+        'timestamp': datetime.now().isoformat(),
+        'symptoms': symptoms,
+        'prediction': result['predictions'][0]['disease'],
+        'confidence': result['predictions'][0]['confidence']
+    })
 
 # ==================== PREDICTION FUNCTION (YOUR CODE) ====================
-def predict_disease(symptoms_text):
+def format_predictions(results):
+    """
+    Turn one backend output ((label id, score) pairs, best first) into the
+    predictions list
+    """
+    predictions = []
+    for label_id, score in results:
+        predictions.append({
+            'disease': DISEASE_NAMES[label_id],
+            'confidence': float(score)
+        })
+    
+    return {'predictions': predictions}
+
+def parse_top_k(value):
+    """
+    Validate a client supplied k; raises ValueError with a message for the client
+    """
+    if value is None:
+        return DEFAULT_TOP_K
+    try:
+        k = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('top_k must be an integer')
+    if not 1 <= k <= len(DISEASE_NAMES):
+        raise ValueError(f'top_k must be between 1 and {len(DISEASE_NAMES)}')
+    return k
+
+def predict_disease(symptoms_text, k=DEFAULT_TOP_K):
     """
     Predict disease from symptoms - EXACT same logic as your tkinter app
     """
     if not symptoms_text.strip():
         return {"error": "Please enter symptoms!"}
     
+    # Same path as batches, so length limits and windowing apply here too
+    return predict_diseases([symptoms_text], k)[0]
+
+# ==================== LENGTH BUCKETING ====================
+# A batch is padded to its longest text, so one long history in a batch of
+# short symptom lists makes every row pay for the long one. Texts are grouped
+# by token length first and each group is padded only to its own maximum.
+BUCKETING = True
+BUCKET_BOUNDARIES = (16, 32, 64, 128, 256, 512)
+
+# Tokens the model actually attended over vs. tokens that were real input
+padding_stats = {'batches': 0, 'real_tokens': 0, 'padded_tokens': 0}
+
+def token_lengths(texts, truncation=True):
+    """
+    Token count of each text as the model will see it (special tokens
+    included, truncated to the model limit unless truncation=False)
+    """
+    encoded = tokenizer(texts, truncation=truncation)
+    return [len(ids) for ids in encoded['input_ids']]
+
+def bucket_by_length(lengths, boundaries=BUCKET_BOUNDARIES):
+    """
+    Group indices by which length bucket they fall in.
+    Returns a list of index lists, shortest bucket first.
+    """
+    buckets = {}
+    for i, length in enumerate(lengths):
+        bucket = next((b for b in boundaries if length <= b), boundaries[-1])
+        buckets.setdefault(bucket, []).append(i)
+    return [buckets[b] for b in sorted(buckets)]
+
+# ==================== LONG NARRATIVES ====================
+# A pasted multi-page history must not cost an unbounded amount of model
+# time. Texts over MAX_INPUT_CHARS are rejected before tokenization; texts
+# over WINDOW_TOKENS are split into overlapping windows that are scored as
+# one batch and averaged. With at most MAX_WINDOWS windows, the worst case
+# for a single request is one batch of MAX_WINDOWS x WINDOW_TOKENS.
+MAX_INPUT_CHARS = 20000
+WINDOW_TOKENS = 512          # per window, special tokens included (model limit is 512)
+WINDOW_OVERLAP = 64          # tokens shared by neighbouring windows
+MAX_WINDOWS = 8
+
+long_input_stats = {'windowed': 0, 'windows': 0, 'rejected': 0}
+
+def split_windows(text, window=None, overlap=None):
+    """
+    Split text into overlapping slices of at most window tokens each.
+    Slices are cut from the original text using the tokenizer's character
+    offsets, so no text is re-assembled from tokens.
+    """
+    window = window or WINDOW_TOKENS
+    overlap = WINDOW_OVERLAP if overlap is None else overlap
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+    
+    size = window - 2   # room for [CLS] and [SEP]
+    step = max(1, size - overlap)
+    windows = []
+    for start in range(0, len(offsets), step):
+        chunk = offsets[start:start + size]
+        windows.append(text[chunk[0][0]:chunk[-1][1]])
+        if start + size >= len(offsets):
+            break
+    return windows
+
+def predict_long(text, k):
+    """
+    Score one over-long text as a batch of windows and combine them into a
+    single result by averaging each disease's probability over the windows.
+    Call with clf_lock held.
+    """
+    windows = split_windows(text)
+    if len(windows) > MAX_WINDOWS:
+        long_input_stats['rejected'] += 1
+        return {"error": f"Symptom text too long ({len(windows)} windows of {WINDOW_TOKENS} tokens, "
+                         f"limit {MAX_WINDOWS}). Please shorten it."}
+    
+    long_input_stats['windowed'] += 1
+    long_input_stats['windows'] += len(windows)
+    
+    # Full distributions are needed to average, so ask for every label
+    totals = [0.0] * len(DISEASE_NAMES)
+    for result in backend.predict(windows, len(DISEASE_NAMES)):
+        for label_id, score in result:
+            totals[label_id] += score
+    
+    started = time.perf_counter()
+    ranked = sorted(range(len(totals)), key=totals.__getitem__, reverse=True)[:k]
+    result = format_predictions([(i, totals[i] / len(windows)) for i in ranked])
+    metrics.observe('postprocess', time.perf_counter() - started)
+    return result
+
+def predict_diseases(texts, k=DEFAULT_TOP_K):
+    """
+    Predict a list of symptom texts, batched into as few forward passes as
+    length bucketing allows. Returns one result dict per text, in order.
+    """
+    outputs = [None] * len(texts)
+    todo = []
+    for i, text in enumerate(texts):
+        if not text.strip():
+            outputs[i] = {"error": "Please enter symptoms!"}
+        elif len(text) > MAX_INPUT_CHARS:
+            long_input_stats['rejected'] += 1
+            outputs[i] = {"error": f"Symptom text too long ({len(text)} characters, "
+                                   f"limit {MAX_INPUT_CHARS}). Please shorten it."}
+        else:
+            todo.append(i)
+    
+    if todo:
+        try:
+            # The tokenizer is used from the same lock: fast tokenizers raise
+            # "Already borrowed" if two threads share one
+            with clf_lock:
+                # A wordpiece is at least one character, so only texts with
+                # more characters than the window can have too many tokens
+                long_ones = [i for i in todo if len(texts[i]) + 2 > WINDOW_TOKENS]
+                
+                lengths = None
+                if (BUCKETING and len(todo) > 1) or long_ones:
+                    lengths = dict(zip(todo, token_lengths([texts[i] for i in todo], truncation=False)))
+                    long_ones = [i for i in long_ones if lengths[i] > WINDOW_TOKENS]
+                    for i in long_ones:
+                        todo.remove(i)
+                        try:
+                            outputs[i] = predict_long(texts[i], k)
+                        except Exception as e:
+                            outputs[i] = {"error": str(e)}
+                
+                if BUCKETING and len(todo) > 1:
+                    groups = [[todo[j] for j in group] for group in bucket_by_length([lengths[i] for i in todo])]
+                    by_index = lengths
+                    for group in groups:
+                        real = [by_index[i] for i in group]
+                        padding_stats['batches'] += 1
+                        padding_stats['real_tokens'] += sum(real)
+                        padding_stats['padded_tokens'] += max(real) * len(real)
+                else:
+                    groups = [todo] if todo else []
+                
+                for group in groups:
+                    # One padded forward pass per group
+                    batch = [texts[i] for i in group]
+                    results = backend.predict(batch, k)
+                    started = time.perf_counter()
+                    for i, result in zip(group, results):
+                        outputs[i] = format_predictions(result)
+                    metrics.observe('postprocess', time.perf_counter() - started)
+        except Exception as e:
+            for i in todo:
+                outputs[i] = {"error": str(e)}
+    
+    return outputs
+
+# ==================== REDUCED PRECISION ====================
+# fp32 is the reference. int8 quantizes the weights of every Linear layer
+# (activations are quantized on the fly); bf16 runs the forward pass under
+# CPU autocast, which only pays off on CPUs with native bf16 support.
+# Check accuracy against fp32 with: python bench.py precision
+PRECISION_MODES = ('fp32', 'int8', 'bf16')
+
+def bf16_supported():
+    import torch
     try:
-        # Use your pipeline (same as tkinter)
-        results = clf(symptoms_text)[0]
-        
-        # Format top 5 predictions (same as tkinter)
-        predictions = []
-        for item in results[:5]:
-            label = item["label"]
-            score = item["score"]
-            disease_name = id2label[label]
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+def apply_precision(mode):
+    """
+    Swap the pipeline's model for a reduced-precision version of it.
+    Returns the new module.
+    """
+    import torch
+    
+    current = clf.model
+    
+    if mode == 'fp32':
+        return current
+    
+    if mode == 'int8':
+        reduced = torch.ao.quantization.quantize_dynamic(current, {torch.nn.Linear}, dtype=torch.qint8)
+    
+    elif mode == 'bf16':
+        if not bf16_supported():
+            raise RuntimeError("This CPU has no native bf16 support, bf16 would be slower than fp32")
+        
+        class BF16Autocast(torch.nn.Module):
+            def __init__(self, inner):
+                super().__init__()
+                self.inner = inner
+                self.config = inner.config
             
-            predictions.append({
-                'disease': disease_name,
-                'confidence': float(score)
-            })
+            def forward(self, **inputs):
+                with torch.autocast('cpu', dtype=torch.bfloat16):
+                    outputs = self.inner(**inputs)
+                # Traced / exported callers ask for return_dict=False and get a tuple
+                if isinstance(outputs, tuple):
+                    return (outputs[0].float(),) + outputs[1:]
+                outputs['logits'] = outputs['logits'].float()
+                return outputs
+        
+        reduced = BF16Autocast(current).eval()
+    
+    else:
+        raise ValueError(f"Unknown precision {mode!r}, expected one of {PRECISION_MODES}")
+    
+    clf.model = reduced
+    return reduced
+
+# ==================== COMPILATION & WARM-UP ====================
+# The first requests after a restart pay for lazy initialization, kernel
+# selection and (when compiled) graph capture. With --compile / --warmup all
+# of that happens at startup, before /readyz reports ready.
+COMPILE_MODES = ('torch', 'trace')
+WARMUP_LENGTHS = BUCKET_BOUNDARIES
+WARMUP_BATCH_SIZES = None     # None = single requests and full micro-batches
+
+def logits_only(inner):
+    """
+    Wrap a classifier so it takes positional tensors and returns only the
+    logits tensor - the form tracing and ONNX export need
+    """
+    import torch
+    
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
         
-        return {'predictions': predictions}
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.inner(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids, return_dict=False)[0]
+    
+    return LogitsOnly(inner)
+
+def compile_model(mode):
+    """
+    Swap the pipeline's model for a compiled version of it.
+    'torch' uses torch.compile with dynamic shapes, 'trace' a frozen
+    TorchScript trace. Returns the new module.
+    """
+    import torch
+    from transformers.modeling_outputs import SequenceClassifierOutput
+    
+    eager = clf.model
+    
+    if mode == 'torch':
+        compiled = torch.compile(eager, dynamic=True)
+    
+    elif mode == 'trace':
+        class TracedClassifier(torch.nn.Module):
+            """
+            Gives the traced graph the keyword / ModelOutput interface the
+            pipeline expects
+            """
+            def __init__(self, traced, config):
+                super().__init__()
+                self.traced = traced
+                self.config = config
+            
+            def forward(self, input_ids, attention_mask=None, token_type_ids=None, **kwargs):
+                if attention_mask is None:
+                    attention_mask = torch.ones_like(input_ids)
+                if token_type_ids is None:
+                    token_type_ids = torch.zeros_like(input_ids)
+                return SequenceClassifierOutput(logits=self.traced(input_ids, attention_mask, token_type_ids))
         
-    except Exception as e:
-        return {"error": str(e)}
+        example = tokenizer(['fever and cough'] * 2, padding='max_length', max_length=64, return_tensors='pt')
+        with torch.no_grad():
+            traced = torch.jit.trace(logits_only(eager).eval(),
+                                     (example['input_ids'], example['attention_mask'], example['token_type_ids']))
+        compiled = TracedClassifier(torch.jit.freeze(traced.eval()), eager.config).eval()
+    
+    else:
+        raise ValueError(f"Unknown compile mode {mode!r}, expected one of {COMPILE_MODES}")
+    
+    clf.model = compiled
+    return compiled
+
+def warmup_texts(length, count):
+    """
+    count texts of roughly length tokens each
+    """
+    words = 'fever headache cough fatigue nausea rash chills pain'.split()
+    text = ' '.join(words[i % len(words)] for i in range(max(1, length - 2)))
+    return [text] * count
+
+def warm_up(lengths=WARMUP_LENGTHS, batch_sizes=WARMUP_BATCH_SIZES):
+    """
+    Run the model once for every representative (batch size, length) shape.
+    Returns {(batch_size, length): seconds} so callers can report it.
+    """
+    if batch_sizes is None:
+        batch_sizes = sorted({1, batcher.max_batch_size})
+    timings = {}
+    for batch_size in batch_sizes:
+        for length in lengths:
+            started = time.perf_counter()
+            predict_diseases(warmup_texts(length, batch_size))
+            timings[(batch_size, length)] = time.perf_counter() - started
+    return timings
+
+def prepare_model(compile_mode=None, warmup=False):
+    """
+    Compile (optional), then warm up the loaded model. Compiling always
+    warms up too, since that is when graph capture actually happens.
+    Precision is switched earlier, in load_model: quantizing builds a new
+    copy of the weights, which pre-fork workers must share, not each make.
+    """
+    if compile_mode:
+        print(f"⚙️  Compiling model ({compile_mode})...")
+        started = time.perf_counter()
+        compile_model(compile_mode)
+        print(f"✅ Compiled in {time.perf_counter() - started:.1f}s")
+    
+    print("🔥 Warming up...")
+    started = time.perf_counter()
+    timings = warm_up()
+    slowest = max(timings, key=timings.get)
+    print(f"✅ Warm-up done in {time.perf_counter() - started:.1f}s "
+          f"({len(timings)} shapes, slowest batch {slowest[0]} x {slowest[1]} tokens: {timings[slowest] * 1000:.0f} ms)")
+
+# ==================== API KEYS & FAIR SCHEDULING ====================
+# Callers are told apart by API key (X-API-Key or "Authorization: Bearer").
+# Each key has a priority class, a weight and an optional token-bucket rate
+# limit. Interactive work always runs before bulk work; within a class the
+# model is shared between clients in proportion to their weight. Requests
+# without a key (the web page, too) run as the "anonymous" client, in the
+# lowest class unless --anonymous-class says otherwise, so dropping a bulk
+# key never buys a caller a better place in the queue.
+API_KEYS_FILE = 'api_keys.json'   # {"<key>": {"name", "class", "weight", "rate", "burst"}}
+PRIORITY_CLASSES = ('interactive', 'bulk')   # highest first
+ANONYMOUS_CLASS = 'bulk'
+REQUIRE_API_KEY = False
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def try_take(self, n=1):
+        """
+        Take n tokens if they are there. Returns 0 on success, otherwise the
+        seconds until they will be.
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= n:
+                self.tokens -= n
+                return 0.0
+            return (n - self.tokens) / self.rate
+    
+    def take(self, n):
+        """
+        Take n tokens even if that runs the bucket into debt; returns how
+        long the caller should wait to stay within the rate
+        """
+        with self.lock:
+            self._refill()
+            self.tokens -= n
+            return max(0.0, -self.tokens / self.rate)
+
+class Client:
+    def __init__(self, name, priority='interactive', weight=1.0, rate=None, burst=None):
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown class {priority!r} for {name}, expected one of {PRIORITY_CLASSES}")
+        if weight <= 0:
+            raise ValueError(f"Weight for {name} must be positive")
+        self.name = name
+        self.priority = priority
+        self.weight = float(weight)
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.latency = Histogram()
+        self.lock = threading.Lock()
+        
+        # ---------- Counters ----------
+        self.requests = 0
+        self.rate_limited = 0
+        self.queued = 0              # texts waiting in the batcher right now
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+    
+    def admit(self, n=1):
+        """
+        Count a request and take n tokens for it. Returns 0 if it may go
+        ahead, otherwise the seconds to send back as Retry-After.
+        """
+        retry = self.bucket.try_take(n) if self.bucket else 0.0
+        with self.lock:
+            self.requests += 1
+            if retry:
+                self.rate_limited += 1
+        return retry
+    
+    def throttle(self, n):
+        """
+        Seconds a streaming caller should pause before scoring n more texts
+        """
+        return self.bucket.take(n) if self.bucket else 0.0
+    
+    def record_wait(self, waited):
+        with self.lock:
+            self.waits += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'class': self.priority,
+                'weight': self.weight,
+                'rate': self.bucket.rate if self.bucket else None,
+                'requests': self.requests,
+                'rate_limited': self.rate_limited,
+                'queued': self.queued,
+                'avg_queue_wait_ms': 1000 * self.wait_total / self.waits if self.waits else 0.0,
+                'max_queue_wait_ms': 1000 * self.wait_max,
+                'avg_latency_ms': 1000 * self.latency.sum / sum(self.latency.counts) if self.latency.sum else 0.0
+            }
+
+anonymous_client = Client('anonymous', ANONYMOUS_CLASS)
+api_clients = {}     # API key -> Client
+
+def load_api_keys(path):
+    """
+    Clients from an API key file (if it exists), keyed by API key
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        config = json.load(f)
+    clients = {}
+    for key, options in config.items():
+        clients[key] = Client(options.get('name', key[:8]), options.get('class', 'bulk'),
+                              options.get('weight', 1.0), options.get('rate'), options.get('burst'))
+    return clients
+
+def all_clients():
+    return [anonymous_client] + sorted(api_clients.values(), key=lambda c: c.name)
+
+class FairQueue:
+    """
+    The micro-batcher's queue. Items of the interactive class always come
+    out before bulk ones. Within a class, weighted fair queuing: every item
+    gets a virtual finish time of max(class clock, client's previous finish)
+    + texts / weight, and the smallest finish time goes first, so a client
+    with a deep backlog cannot crowd out the others. Bounded by the number
+    of texts waiting; put raises queue.Full past that, after waiting up to
+    `timeout` for room.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.size = 0
+        self.heaps = {priority: [] for priority in PRIORITY_CLASSES}
+        self.clock = {priority: 0.0 for priority in PRIORITY_CLASSES}
+        self.last_finish = {}        # client name -> virtual finish time of its newest item
+        self.order = itertools.count()
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)   # signalled when an item goes in
+        self.room = threading.Condition(self.lock)    # ...and when one comes out
+    
+    def qsize(self):
+        return self.size
+    
+    def put(self, item, client, cost=1, timeout=None):
+        with self.lock:
+            # One oversized item may still go into an empty queue
+            if not self.room.wait_for(lambda: not self.size or self.size + cost <= self.maxsize, timeout):
+                raise queue.Full
+            priority = client.priority
+            finish = max(self.clock[priority], self.last_finish.get(client.name, 0.0)) + cost / client.weight
+            self.last_finish[client.name] = finish
+            heapq.heappush(self.heaps[priority], (finish, next(self.order), cost, client, item))
+            self.size += cost
+            client.queued += cost
+            self.ready.notify()
+    
+    def put_nowait(self, item, client, cost=1):
+        self.put(item, client, cost, timeout=0)
+    
+    def get(self, timeout=None):
+        with self.lock:
+            if not self.ready.wait_for(lambda: self.size > 0, timeout):
+                raise queue.Empty
+            for priority in PRIORITY_CLASSES:
+                if self.heaps[priority]:
+                    finish, _, cost, client, item = heapq.heappop(self.heaps[priority])
+                    self.clock[priority] = finish
+                    self.size -= cost
+                    client.queued -= cost
+                    self.room.notify_all()
+                    return item
+    
+    def get_nowait(self):
+        return self.get(timeout=0)
+
+# ==================== MICRO-BATCHING ====================
+BATCH_MAX_SIZE = 16      # run the model as soon as this many requests are waiting
+BATCH_MAX_WAIT_MS = 5    # ...or when the oldest request has waited this long
+BATCH_MAX_QUEUE = 256    # texts allowed to wait; more are turned away with a 503
+
+class Overloaded(Exception):
+    """
+    The inference queue is full
+    """
+
+class DeadlineExceeded(Exception):
+    """
+    The caller's deadline passed before the model got to its request
+    """
+
+class MicroBatcher:
+    """
+    Sits between the handler and the pipeline. Requests that arrive close
+    together are collected into one batch and run with a single forward pass;
+    every caller gets back its own results. Which requests go first is up
+    to the FairQueue.
+    """
+    def __init__(self, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, max_queue=BATCH_MAX_QUEUE):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = FairQueue(max(1, max_queue))
+        self.lock = threading.Lock()
+        self.thread = None
+        
+        # ---------- Counters ----------
+        self.batches = 0
+        self.requests = 0            # callers served (a batch-stream chunk is one)
+        self.texts = 0
+        self.batch_sizes = {}        # texts per forward pass -> number of batches
+        self.wait_total = 0.0        # seconds spent queued, summed over requests
+        self.wait_max = 0.0
+        self.forward_total = 0.0     # seconds spent inside the model
+        self.rejected = 0            # turned away because the queue was full
+        self.expired = 0             # dropped because their deadline passed while queued
+    
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self.thread.start()
+    
+    def submit(self, texts, k=DEFAULT_TOP_K, deadline=None, client=None, wait=0):
+        """
+        Queue texts from one caller and return a Future that resolves to
+        their result dicts. Raises Overloaded if the queue is still full
+        after waiting `wait` seconds for room.
+        `deadline` is a time.monotonic() value; if it passes before the
+        batch runs, the Future fails with DeadlineExceeded instead of
+        using the model.
+        """
+        self.start()
+        client = client or anonymous_client
+        future = Future()
+        try:
+            self.queue.put((texts, k, future, time.monotonic(), deadline, client), client, len(texts), wait)
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            raise Overloaded(f'Inference queue is full ({self.queue.maxsize} waiting)')
+        return future
+    
+    def predict(self, symptoms_text, k=DEFAULT_TOP_K, deadline=None, client=None):
+        return self.submit([symptoms_text], k, deadline, client).result()[0]
+    
+    def _collect(self):
+        first = self.queue.get()
+        batch = [first]
+        size = len(first[0])
+        deadline = first[3] + self.max_wait
+        
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self.queue.get(timeout=remaining)
+                else:
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            
+            # Callers that have given up do not get a slot in the forward pass
+            live = []
+            for item in batch:
+                if item[4] is not None and item[4] <= started:
+                    item[2].set_exception(DeadlineExceeded('Deadline passed while queued'))
+                else:
+                    live.append(item)
+            if len(live) < len(batch):
+                with self.lock:
+                    self.expired += len(batch) - len(live)
+                batch = live
+                if not batch:
+                    continue
+            
+            # Run the batch at the largest k anyone asked for, then trim
+            texts = [text for item in batch for text in item[0]]
+            try:
+                results = predict_diseases(texts, max(item[1] for item in batch))
+            except Exception as e:
+                results = [{"error": str(e)}] * len(texts)
+            
+            finished = time.monotonic()
+            self._record(batch, started, finished)
+            
+            position = 0
+            for item_texts, k, future, _, _, _ in batch:
+                item_results = []
+                for result in results[position:position + len(item_texts)]:
+                    if 'predictions' in result and len(result['predictions']) > k:
+                        result = {'predictions': result['predictions'][:k]}
+                    item_results.append(result)
+                position += len(item_texts)
+                future.set_result(item_results)
+    
+    def _record(self, batch, started, finished):
+        with self.lock:
+            size = sum(len(item[0]) for item in batch)
+            self.batches += 1
+            self.requests += len(batch)
+            self.texts += size
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+            self.forward_total += finished - started
+            for _, _, _, queued_at, _, client in batch:
+                waited = started - queued_at
+                client.record_wait(waited)
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'batches': self.batches,
+                'requests': self.requests,
+                'queued': self.queue.qsize(),
+                'max_queue': self.queue.maxsize,
+                'rejected': self.rejected,
+                'expired': self.expired,
+                'texts': self.texts,
+                'avg_batch_size': self.texts / self.batches if self.batches else 0.0,
+                'batch_sizes': {str(k): v for k, v in sorted(self.batch_sizes.items())},
+                'avg_queue_wait_ms': 1000 * self.wait_total / self.requests if self.requests else 0.0,
+                'max_queue_wait_ms': 1000 * self.wait_max,
+                'avg_forward_ms': 1000 * self.forward_total / self.batches if self.batches else 0.0
+            }
+
+batcher = MicroBatcher()
+
+# ==================== PREDICTION CACHE ====================
+CACHE_MAX_ENTRIES = 10000
+CACHE_MAX_MB = 32
+CACHE_TTL_SECONDS = 3600
+
+class PredictionCache:
+    """
+    LRU + TTL cache of /predict results, keyed on the normalized symptom text
+    and the model revision. Bounded both by entry count and by (estimated)
+    bytes. Identical requests that arrive while the first one is still being
+    computed wait for that computation instead of running their own - but
+    only behind a request of the same priority class, and only until their
+    own deadline.
+    """
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_mb=CACHE_MAX_MB, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl
+        self.entries = OrderedDict()   # key -> (result, size, expires_at)
+        self.inflight = {}             # (key, priority class) -> Future
+        self.bytes = 0
+        self.lock = threading.Lock()
+        
+        # ---------- Counters ----------
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def make_key(symptoms_text, k):
+        # Case only folds together for an uncased tokenizer; with a cased
+        # model "MS" and "ms" are different inputs
+        if getattr(tokenizer, 'do_lower_case', False):
+            symptoms_text = symptoms_text.lower()
+        return (model_revision, k, ' '.join(symptoms_text.split()))
+    
+    def _evict(self):
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            _, (_, size, _) = self.entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+    
+    def predict(self, symptoms_text, compute, k=DEFAULT_TOP_K, deadline=None, priority=None):
+        """
+        Return the cached result for this text, or compute(symptoms_text, k)
+        once and share it with every concurrent caller asking for the same
+        key. compute carries the caller's own deadline and client, so it is
+        only ever run on behalf of the caller that passed it. `deadline` (a
+        time.monotonic() value) bounds how long this caller waits for
+        somebody else's computation.
+        """
+        if self.max_entries <= 0:
+            return compute(symptoms_text, k)
+        
+        key = self.make_key(symptoms_text, k)
+        
+        while True:
+            now = time.monotonic()
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    if entry[2] > now:
+                        self.entries.move_to_end(key)
+                        self.hits += 1
+                        return entry[0]
+                    del self.entries[key]
+                    self.bytes -= entry[1]
+                
+                future = self.inflight.get((key, priority))
+                if future is None:
+                    self.misses += 1
+                    future = Future()
+                    self.inflight[(key, priority)] = future
+                    break
+                self.coalesced += 1
+            
+            timeout = None if deadline is None else max(0.0, deadline - now)
+            try:
+                return future.result(timeout)
+            except FutureTimeout:
+                raise DeadlineExceeded('Deadline passed while waiting for an identical request')
+            except DeadlineExceeded:
+                # The owner's deadline is not ours: try again on our own
+                continue
+        
+        try:
+            result = compute(symptoms_text, k)
+        except (Overloaded, DeadlineExceeded) as e:
+            # Not an answer: callers sharing this computation get the same
+            # refusal (or retry, for a deadline), and nothing is cached
+            with self.lock:
+                del self.inflight[(key, priority)]
+            future.set_exception(e)
+            raise
+        except Exception as e:
+            result = {"error": str(e)}
+        
+        with self.lock:
+            del self.inflight[(key, priority)]
+            # Errors are handed to the waiting callers but never stored
+            if 'error' not in result:
+                size = len(key[2]) + len(json.dumps(result)) + 256
+                if size <= self.max_bytes:
+                    self.entries[key] = (result, size, time.monotonic() + self.ttl)
+                    self.bytes += size
+                    self._evict()
+        
+        future.set_result(result)
+        return result
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'inflight': len(self.inflight),
+                'hit_ratio': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                'miss_ratio': self.misses / lookups if lookups else 0.0
+            }
+
+prediction_cache = PredictionCache()
+
+# ==================== BATCH / NDJSON STREAMING ====================
+STREAM_CHUNK_SIZE = 32   # texts per forward pass on POST /predict/batch
+STREAM_QUEUE_WAIT = 30   # seconds a chunk waits for room in a full queue before the stream gives up
+BATCH_ITEM_OVERHEAD = 1024   # characters of JSON allowed around one text ({"symptoms": ...}, spacing)
+
+class BodyReader:
+    """
+    File-like view of a request body that stops at Content-Length, so gzip
+    and the JSON parser can read from it without reading past the request
+    """
+    on_done = None   # called once the whole body has been read
+    
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+    
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.rfile.read(size)
+        if not data:
+            raise EOFError('Request body ended before Content-Length')
+        self.remaining -= len(data)
+        if self.remaining <= 0 and self.on_done is not None:
+            self.on_done()
+        return data
+
+def _batch_item_text(item):
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict) and isinstance(item.get('symptoms', ''), str):
+        return item.get('symptoms', '')
+    raise ValueError('each item must be a string or {"symptoms": "..."}')
+
+def batch_item_limit():
+    """
+    Longest JSON item (in characters) worth buffering: MAX_INPUT_CHARS of
+    text written entirely in \\uXXXX escapes, plus the JSON around it.
+    Anything longer would be rejected anyway, so the stream fails instead.
+    """
+    return 6 * MAX_INPUT_CHARS + BATCH_ITEM_OVERHEAD
+
+# Characters that can end or change the state of a JSON item being scanned
+_STRING_SPECIAL = re.compile(r'["\\]')
+_VALUE_SPECIAL = re.compile(r'["{}\[\],\s]')
+
+def iter_batch_texts(stream, read_size=65536, max_item_chars=None, max_bytes=None):
+    """
+    Yield symptom texts from a JSON array or NDJSON body one at a time,
+    without ever holding the whole body in memory. Each item is scanned
+    once, picking up where the previous read stopped, and decoded when it
+    is complete. Raises ValueError for a malformed body, for an item longer
+    than max_item_chars (default batch_item_limit()) and once more than
+    max_bytes have been read from stream.
+    """
+    max_item_chars = max_item_chars or batch_item_limit()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    decoder = json.JSONDecoder()
+    buf = ''
+    eof = False
+    total = 0
+    
+    def fill():
+        nonlocal buf, eof, total
+        data = stream.read(read_size)
+        eof = not data
+        total += len(data)
+        if max_bytes is not None and total > max_bytes:
+            raise ValueError(f'body is larger than {max_bytes} bytes')
+        buf += utf8.decode(data, final=eof)
+    
+    def too_long(pending):
+        if pending > max_item_chars:
+            raise ValueError(f'item longer than {max_item_chars} characters')
+    
+    # Look at the first non-blank character to tell the two formats apart
+    while not eof and not buf:
+        fill()
+        buf = buf.lstrip()
+    
+    if buf.startswith('['):
+        pos = 1
+        while True:
+            # Skip separators between items
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                buf, pos = '', 0
+                fill()
+            
+            if pos >= len(buf):
+                raise ValueError('unterminated JSON array')
+            if buf[pos] == ']':
+                return
+            
+            # Find where the item ends: track string / nesting state from
+            # `scan` on, so a read boundary inside the item costs nothing
+            start = scan = pos
+            depth = 0
+            in_string = False
+            end = None
+            while end is None:
+                if in_string:
+                    match = _STRING_SPECIAL.search(buf, scan)
+                    if match is None or (match.group() == '\\' and match.end() >= len(buf)):
+                        scan = len(buf) if match is None else match.start()
+                    elif match.group() == '\\':
+                        scan = match.end() + 1
+                        continue
+                    else:
+                        in_string = False
+                        scan = match.end()
+                        if depth == 0:
+                            end = scan
+                        continue
+                else:
+                    match = _VALUE_SPECIAL.search(buf, scan)
+                    if match is not None:
+                        char = match.group()
+                        scan = match.end()
+                        if char == '"':
+                            in_string = True
+                        elif char in '{[':
+                            depth += 1
+                        elif depth == 0:
+                            # A bare value (number, true...) ends here
+                            end = match.start()
+                        elif char in '}]':
+                            depth -= 1
+                            if depth == 0:
+                                end = scan
+                        continue
+                    scan = len(buf)
+                
+                # Item is cut off at the end of the buffer, read more
+                if eof:
+                    raise ValueError('unterminated JSON array')
+                too_long(len(buf) - start)
+                buf, scan, pos, start = buf[start:], scan - start, 0, 0
+                fill()
+            
+            too_long(end - start)
+            item, decoded_end = decoder.raw_decode(buf, start)
+            if decoded_end != end:
+                raise ValueError(f'malformed item at character {start}')
+            yield _batch_item_text(item)
+            pos = end
+    else:
+        start = scan = 0
+        while True:
+            newline = buf.find('\n', scan)
+            if newline < 0:
+                if eof:
+                    break
+                too_long(len(buf) - start)
+                buf, start = buf[start:], 0
+                scan = len(buf)
+                fill()
+                continue
+            too_long(newline - start)
+            line = buf[start:newline]
+            start = scan = newline + 1
+            if line.strip():
+                yield _batch_item_text(json.loads(line))
+        too_long(len(buf) - start)
+        if buf[start:].strip():
+            yield _batch_item_text(json.loads(buf[start:]))
+
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# ==================== RESPONSE FORMATS ====================
+# /predict and /predict/batch answer in JSON unless the Accept header asks
+# for a packed form:
+#   application/x-msgpack          {'labels_version', 'ids', 'scores'} per
+#                                  result (needs the msgpack package)
+#   application/x-float32-vector   all label scores as little-endian
+#                                  float32, indexed by label id
+# Binary results carry label ids only; names come from GET /labels, which
+# is versioned (X-Labels-Version, sent with every prediction) so clients
+# fetch it once. A float32 batch stream has exactly one vector per input
+# row (all NaN for a row the model failed on); if the stream stops early it
+# simply has fewer vectors than inputs, so clients must compare the vector
+# count with their input count. The reason is sent in an X-Stream-Error
+# trailer only if the request says it can read one (TE: trailers, which
+# fetch and most HTTP libraries do not send); over HTTP/1.0 there is none.
+STREAM_ERROR_TRAILER = 'X-Stream-Error'
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_TYPE = 'application/x-msgpack'
+FLOAT32_TYPE = 'application/x-float32-vector'
+LABEL_IDS = {name: i for i, name in enumerate(DISEASE_NAMES)}
+LABELS_VERSION = hashlib.sha1(json.dumps(DISEASE_NAMES).encode()).hexdigest()[:12]
+
+def response_format(accept):
+    """
+    'json', 'msgpack' or 'float32' - the packed form with the highest q in
+    the Accept header, JSON when none is asked for (or msgpack is missing)
+    """
+    best, best_q = 'json', 0.0
+    for part in (accept or '').split(','):
+        media_type, _, params = part.strip().partition(';')
+        media_type = media_type.strip().lower()
+        if media_type in (MSGPACK_TYPE, 'application/msgpack', 'application/vnd.msgpack') and msgpack is not None:
+            fmt = 'msgpack'
+        elif media_type == FLOAT32_TYPE:
+            fmt = 'float32'
+        else:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = fmt, q
+    return best
+
+def encode_result(result, fmt):
+    """
+    One formatted result (or {'error': ...}) in a packed form. A float32
+    vector has no room for an error, so those come out as all NaN.
+    """
+    if fmt == 'float32':
+        vector = array.array('f', [float('nan') if 'error' in result else 0.0]) * len(DISEASE_NAMES)
+        for p in result.get('predictions', ()):
+            vector[LABEL_IDS[p['disease']]] = p['confidence']
+        if sys.byteorder != 'little':
+            vector.byteswap()
+        return vector.tobytes()
+    
+    if 'error' in result:
+        packed = {'error': result['error']}
+    else:
+        packed = {'labels_version': LABELS_VERSION,
+                  'ids': [LABEL_IDS[p['disease']] for p in result['predictions']],
+                  'scores': [p['confidence'] for p in result['predictions']]}
+    if 'index' in result:
+        packed['index'] = result['index']
+    return msgpack.packb(packed, use_single_float=True)
 
 # ==================== WEB SERVER HTML ====================
-HTML = """<!DOCTYPE html>
-<html lang="en" data-theme="light">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Health Monitoring System</title>
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css">
-    <style>
-        :root {
+# The stylesheet and script are served as fingerprinted files under
+# /static/ (see STATIC ASSETS); the page itself only carries the few
+# values that depend on the model state.
+# ---------- Styles ----------
+PAGE_CSS = """        :root {
             --bg-primary: #f5f6fa;
             --bg-secondary: #ffffff;
             --bg-sidebar: linear-gradient(180deg, #667eea 0%, #764ba2 100%);
@@ -367,6 +2232,18 @@ HTML = """<!DOCTYPE html>
             border-color: #7d2a2a;
         }
         
+        .status-box.loading {
+            background: #fff3cd;
+            color: #856404;
+            border: 2px solid #ffeeba;
+        }
+        
+        [data-theme="dark"] .status-box.loading {
+            background: #4d3d0f;
+            color: #ffd866;
+            border-color: #6b5514;
+        }
+        
         /* Stats Cards */
         .stats-grid {
             display: grid;
@@ -657,69 +2534,440 @@ HTML = """<!DOCTYPE html>
             color: #ffd966;
         }
         
-        /* Disease List */
-        .disease-list {
-            columns: 2;
-            column-gap: 20px;
-        }
+        /* Disease List */
+        .disease-list {
+            columns: 2;
+            column-gap: 20px;
+        }
+        
+        .disease-list div {
+            padding: 8px 0;
+            color: var(--text-secondary);
+            break-inside: avoid;
+        }
+        
+        /* Table */
+        table {
+            width: 100%;
+            border-collapse: collapse;
+            margin-top: 20px;
+        }
+        
+        th, td {
+            padding: 12px;
+            text-align: left;
+            border-bottom: 1px solid var(--border-color);
+            color: var(--text-primary);
+        }
+        
+        th {
+            background: var(--result-bg);
+            font-weight: 600;
+            color: var(--text-tertiary);
+        }
+        
+        tr:hover {
+            background: var(--table-hover);
+        }
+        
+        /* History: fixed-height rows so only the visible ones need rendering */
+        .history-viewport {
+            max-height: 600px;
+            overflow-y: auto;
+            margin-top: 20px;
+        }
+        
+        .history-viewport table {
+            margin-top: 0;
+        }
+        
+        .history-viewport th {
+            position: sticky;
+            top: 0;
+        }
+        
+        .history-viewport tbody tr {
+            height: 49px;
+        }
+        
+        .history-viewport td {
+            white-space: nowrap;
+        }
+        
+        .history-viewport tr.history-spacer,
+        .history-viewport tr.history-spacer td {
+            height: auto;
+            padding: 0;
+            border: none;
+        }
+        
+        /* Responsive */
+        @media (max-width: 768px) {
+            .sidebar {
+                width: 70px;
+            }
+            
+            .logo-text,
+            .nav-link span {
+                display: none;
+            }
+            
+            .main-content {
+                margin-left: 70px;
+                padding: 20px;
+                padding-top: 80px;
+            }
+            
+            .disease-list {
+                columns: 1;
+            }
+            
+            .theme-toggle {
+                top: 10px;
+                right: 10px;
+            }
+        }
+"""
+
+# ---------- Script ----------
+PAGE_JS = """        // Dark Mode Toggle
+        function toggleTheme() {
+            const html = document.documentElement;
+            const currentTheme = html.getAttribute('data-theme');
+            const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
+            
+            html.setAttribute('data-theme', newTheme);
+            localStorage.setItem('theme', newTheme);
+            
+            document.getElementById('darkIcon').classList.toggle('active');
+            document.getElementById('lightIcon').classList.toggle('active');
+        }
+        
+        // Load saved theme
+        window.addEventListener('load', () => {
+            const savedTheme = localStorage.getItem('theme') || 'light';
+            document.documentElement.setAttribute('data-theme', savedTheme);
+            
+            if (savedTheme === 'dark') {
+                document.getElementById('darkIcon').classList.add('active');
+                document.getElementById('lightIcon').classList.remove('active');
+            }
+            
+            // Load diseases
+            const diseases = DISEASES;
+            const diseaseList = document.getElementById('disease-list');
+            
+            let html = '';
+            diseases.forEach(disease => {
+                html += `<div>• ${disease}</div>`;
+            });
+            diseaseList.innerHTML = html;
+            
+            if (!modelLoaded) {
+                waitForModel();
+            }
+        });
+        
+        // The server answers before the model has finished loading, so keep
+        // asking /readyz and flip the status box once it is ready
+        async function waitForModel() {
+            try {
+                const response = await fetch('/readyz');
+                const data = await response.json();
+                
+                if (data.status === 'ready') {
+                    modelLoaded = true;
+                    document.getElementById('model-status').className = 'status-box success';
+                    document.getElementById('model-status-icon').className = 'fas fa-check-circle';
+                    document.getElementById('model-status-text').textContent = '✅ AI Model Loaded Successfully';
+                    document.getElementById('model-status-detail').textContent = 'System ready to analyze symptoms';
+                    return;
+                }
+                
+                if (data.status === 'failed') {
+                    return;
+                }
+            } catch (error) {
+                console.error('Error checking model status:', error);
+            }
+            
+            setTimeout(waitForModel, 2000);
+        }
+        
+        // Navigation
+        function showPage(pageName) {
+            document.querySelectorAll('.page').forEach(page => {
+                page.classList.remove('active');
+            });
+            
+            document.querySelectorAll('.nav-link').forEach(link => {
+                link.classList.remove('active');
+            });
+            
+            document.getElementById(pageName).classList.add('active');
+            event.target.closest('.nav-link').classList.add('active');
+            
+            if (pageName === 'history') {
+                loadHistory();
+            } else {
+                closeHistoryStream();
+            }
+        }
+        
+        function fillExample(text) {
+            document.getElementById('symptoms').value = text;
+        }
+        
+        async function predict() {
+            const symptoms = document.getElementById('symptoms').value.trim();
+            
+            if (!symptoms) {
+                alert('⚠️ Please describe your symptoms');
+                return;
+            }
+            
+            if (!modelLoaded) {
+                alert('❌ Model not loaded. Please check Overview page for instructions.');
+                return;
+            }
+            
+            const resultSection = document.getElementById('results');
+            const resultContent = document.getElementById('resultContent');
+            
+            resultContent.innerHTML = `
+                <div class="loader">
+                    <div class="spinner"></div>
+                    <p style="color: #667eea; font-size: 18px; font-weight: 600;">Analyzing symptoms...</p>
+                    <small style="color: var(--text-secondary);">This may take a few seconds</small>
+                </div>
+            `;
+            resultSection.classList.add('show');
+            
+            try {
+                const response = await fetch('/predict', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ symptoms: symptoms })
+                });
+                
+                const data = await response.json();
+                
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                
+                const top = data.predictions[0];
+                const confidence = (top.confidence * 100);
+                
+                let html = `
+                    <div class="primary-result">
+                        <h3>🎯 Most Likely: ${top.disease}</h3>
+                        <div style="font-size: 18px; margin-top: 10px;">
+                            Confidence: ${confidence.toFixed(2)}%
+                        </div>
+                        <div class="confidence-bar">
+                            <div class="confidence-fill" style="width: ${confidence}%"></div>
+                        </div>
+                    </div>
+                    
+                    <div class="predictions-list">
+                        <h3>📊 Top 5 Predictions:</h3>
+                `;
+                
+                data.predictions.forEach((pred, index) => {
+                    const conf = (pred.confidence * 100);
+                    html += `
+                        <div class="prediction-item">
+                            <strong>${index + 1}. ${pred.disease}</strong>
+                            <small>Confidence: ${conf.toFixed(4)}%</small>
+                            <div class="prediction-bar">
+                                <div class="prediction-bar-fill" style="width: ${conf}%"></div>
+                            </div>
+                        </div>
+                    `;
+                });
+                
+                html += `
+                    </div>
+                    <div class="warning">
+                        <strong><i class="fas fa-exclamation-triangle"></i> Medical Disclaimer:</strong>
+                        This AI analysis is for informational purposes only. Always consult a qualified healthcare professional.
+                    </div>
+                `;
+                
+                resultContent.innerHTML = html;
+                
+                // Update counter
+                const current = parseInt(document.getElementById('total-predictions').textContent);
+                document.getElementById('total-predictions').textContent = current + 1;
+                
+            } catch (error) {
+                resultContent.innerHTML = `
+                    <div style="padding: 25px; background: #ffebee; border-radius: 15px; border-left: 5px solid #f44336;">
+                        <strong style="color: #c62828; font-size: 18px;">
+                            <i class="fas fa-times-circle"></i> Error:
+                        </strong>
+                        <p style="margin-top: 10px; color: #666;">${error.message}</p>
+                    </div>
+                `;
+            }
+        }
+        
+        // History: one page is fetched when the page opens, after that new
+        // entries are pushed over /history/stream. Only the rows scrolled
+        // into view are in the DOM, so long histories stay cheap to show.
+        const HISTORY_ROW_HEIGHT = 49;   // px, matches .history-viewport tbody tr
+        const HISTORY_OVERSCAN = 10;     // rows rendered above/below the visible ones
+        const HISTORY_PAGE = 200;
+        let historyRows = [];            // newest first
+        let historyCursor = null;        // next_cursor for older entries
+        let historyLoadingOlder = false;
+        let historyStream = null;
         
-        .disease-list div {
-            padding: 8px 0;
-            color: var(--text-secondary);
-            break-inside: avoid;
+        function escapeHtml(text) {
+            const div = document.createElement('div');
+            div.textContent = text;
+            return div.innerHTML;
         }
         
-        /* Table */
-        table {
-            width: 100%;
-            border-collapse: collapse;
-            margin-top: 20px;
+        async function loadHistory() {
+            closeHistoryStream();
+            try {
+                const response = await fetch(`/history?limit=${HISTORY_PAGE}`);
+                const data = await response.json();
+                
+                historyRows = data.history.slice().reverse();
+                historyCursor = data.next_cursor;
+                document.getElementById('historyContent').innerHTML = '';
+                renderHistory();
+                openHistoryStream(historyRows.length ? historyRows[0].id : data.latest);
+                
+            } catch (error) {
+                console.error('Error loading history:', error);
+            }
         }
         
-        th, td {
-            padding: 12px;
-            text-align: left;
-            border-bottom: 1px solid var(--border-color);
-            color: var(--text-primary);
+        function openHistoryStream(since) {
+            // EventSource reconnects by itself and resumes from the last event id
+            historyStream = new EventSource(`/history/stream?since=${since}`);
+            historyStream.onmessage = (event) => {
+                const item = JSON.parse(event.data);
+                if (historyRows.length && item.id <= historyRows[0].id) {
+                    return;
+                }
+                historyRows.unshift(item);
+                
+                // Keep the rows the user is looking at in place
+                const viewport = document.getElementById('historyViewport');
+                if (viewport && viewport.scrollTop > 0) {
+                    viewport.scrollTop += HISTORY_ROW_HEIGHT;
+                }
+                renderHistory();
+            };
         }
         
-        th {
-            background: var(--result-bg);
-            font-weight: 600;
-            color: var(--text-tertiary);
+        function closeHistoryStream() {
+            if (historyStream) {
+                historyStream.close();
+                historyStream = null;
+            }
         }
         
-        tr:hover {
-            background: var(--table-hover);
+        async function loadOlderHistory() {
+            historyLoadingOlder = true;
+            try {
+                const response = await fetch(`/history?limit=${HISTORY_PAGE}&cursor=${historyCursor}`);
+                const data = await response.json();
+                historyRows = historyRows.concat(data.history.slice().reverse());
+                historyCursor = data.next_cursor;
+                renderHistoryRows();
+            } catch (error) {
+                console.error('Error loading older history:', error);
+            } finally {
+                historyLoadingOlder = false;
+            }
         }
         
-        /* Responsive */
-        @media (max-width: 768px) {
-            .sidebar {
-                width: 70px;
-            }
+        function renderHistory() {
+            const historyContent = document.getElementById('historyContent');
             
-            .logo-text,
-            .nav-link span {
-                display: none;
+            if (historyRows.length === 0) {
+                historyContent.innerHTML = `
+                    <p style="text-align: center; color: var(--text-secondary); padding: 40px;">
+                        No predictions yet. Try the Predict Disease page!
+                    </p>
+                `;
+                return;
             }
             
-            .main-content {
-                margin-left: 70px;
-                padding: 20px;
-                padding-top: 80px;
+            if (!document.getElementById('historyViewport')) {
+                historyContent.innerHTML = `
+                    <div id="historyViewport" class="history-viewport" onscroll="renderHistoryRows()">
+                        <table>
+                            <thead>
+                                <tr>
+                                    <th>Date & Time</th>
+                                    <th>Symptoms</th>
+                                    <th>Prediction</th>
+                                    <th>Confidence</th>
+                                </tr>
+                            </thead>
+                            <tbody id="historyBody"></tbody>
+                        </table>
+                    </div>
+                `;
+            }
+            renderHistoryRows();
+        }
+        
+        function renderHistoryRows() {
+            const viewport = document.getElementById('historyViewport');
+            const body = document.getElementById('historyBody');
+            if (!viewport || !body) {
+                return;
             }
             
-            .disease-list {
-                columns: 1;
+            const first = Math.max(0, Math.floor(viewport.scrollTop / HISTORY_ROW_HEIGHT) - HISTORY_OVERSCAN);
+            const last = Math.min(historyRows.length,
+                Math.ceil((viewport.scrollTop + viewport.clientHeight) / HISTORY_ROW_HEIGHT) + HISTORY_OVERSCAN);
+            
+            let html = `<tr class="history-spacer"><td colspan="4" style="height: ${first * HISTORY_ROW_HEIGHT}px"></td></tr>`;
+            for (let i = first; i < last; i++) {
+                const item = historyRows[i];
+                const time = new Date(item.timestamp).toLocaleString();
+                const symptoms = item.symptoms.length > 60 
+                    ? item.symptoms.substring(0, 60) + '...' 
+                    : item.symptoms;
+                const conf = (item.confidence * 100).toFixed(2);
+                
+                html += `
+                    <tr>
+                        <td>${time}</td>
+                        <td>${escapeHtml(symptoms)}</td>
+                        <td><strong>${escapeHtml(item.prediction)}</strong></td>
+                        <td>${conf}%</td>
+                    </tr>
+                `;
             }
+            html += `<tr class="history-spacer"><td colspan="4" style="height: ${(historyRows.length - last) * HISTORY_ROW_HEIGHT}px"></td></tr>`;
+            body.innerHTML = html;
             
-            .theme-toggle {
-                top: 10px;
-                right: 10px;
+            // Near the end of what we have: fetch the next older page
+            if (last === historyRows.length && historyCursor && !historyLoadingOlder) {
+                loadOlderHistory();
             }
         }
-    </style>
+"""
+
+# ---------- Page ----------
+HTML = """<!DOCTYPE html>
+<html lang="en" data-theme="light">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Health Monitoring System</title>
+    ICON_STYLESHEET
+    <link rel="stylesheet" href="STATIC_APP_CSS">
 </head>
 <body>
     <!-- Dark Mode Toggle -->
@@ -767,11 +3015,11 @@ HTML = """<!DOCTYPE html>
                 <p>AI-Powered Disease Prediction System</p>
             </div>
             
-            <div class="status-box MODEL_STATUS_CLASS">
-                <i class="fas MODEL_STATUS_ICON"></i>
+            <div class="status-box MODEL_STATUS_CLASS" id="model-status">
+                <i class="fas MODEL_STATUS_ICON" id="model-status-icon"></i>
                 <div>
-                    <strong>MODEL_STATUS_TEXT</strong>
-                    <div style="font-size: 14px; margin-top: 5px;">MODEL_STATUS_DETAIL</div>
+                    <strong id="model-status-text">MODEL_STATUS_TEXT</strong>
+                    <div style="font-size: 14px; margin-top: 5px;" id="model-status-detail">MODEL_STATUS_DETAIL</div>
                 </div>
             </div>
             
@@ -871,369 +3119,1186 @@ HTML = """<!DOCTYPE html>
                         ❤️ <strong>Heart Attack:</strong> Chest pain, sweating, breathing difficulty
                     </div>
                     <div class="example" onclick="fillExample('Difficulty breathing, wheezing sound when exhaling, chest tightness and shortness of breath')">
-                        🫁 <strong>Asthma:</strong> Breathing difficulty, wheezing, chest tightness
-                    </div>
-                </div>
-                
-                <label for="symptoms">
-                    <i class="fas fa-notes-medical"></i> Describe your symptoms in detail:
-                </label>
-                <textarea 
-                    id="symptoms" 
-                    placeholder="Be as detailed as possible. Example: I have been experiencing high fever (102°F) for the past 3 days, along with severe headache, body aches, extreme weakness, and dry cough..."
-                ></textarea>
-                
-                <button onclick="predict()" id="predictBtn">
-                    <i class="fas fa-magic"></i> Analyze Symptoms
-                </button>
-                
-                <div class="result-section" id="results">
-                    <div id="resultContent"></div>
-                </div>
-            </div>
-        </div>
-        
-        <!-- History Page -->
-        <div id="history" class="page">
-            <div class="page-header">
-                <h1>📋 Prediction History</h1>
-                <p>Your recent symptom analyses</p>
-            </div>
-            
-            <div class="card">
-                <div class="card-header">
-                    <span><i class="fas fa-history"></i> Recent Assessments</span>
-                    <button class="btn btn-primary" onclick="loadHistory()">
-                        <i class="fas fa-sync"></i> Refresh
-                    </button>
-                </div>
-                <div id="historyContent">
-                    <p style="text-align: center; color: var(--text-secondary); padding: 40px;">
-                        No predictions yet. Try the Predict Disease page!
-                    </p>
-                </div>
-            </div>
-        </div>
-    </main>
-    
-    <script>
-        const modelLoaded = MODEL_LOADED_VALUE;
-        
-        // Dark Mode Toggle
-        function toggleTheme() {
-            const html = document.documentElement;
-            const currentTheme = html.getAttribute('data-theme');
-            const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
-            
-            html.setAttribute('data-theme', newTheme);
-            localStorage.setItem('theme', newTheme);
-            
-            document.getElementById('darkIcon').classList.toggle('active');
-            document.getElementById('lightIcon').classList.toggle('active');
-        }
-        
-        // Load saved theme
-        window.addEventListener('load', () => {
-            const savedTheme = localStorage.getItem('theme') || 'light';
-            document.documentElement.setAttribute('data-theme', savedTheme);
-            
-            if (savedTheme === 'dark') {
-                document.getElementById('darkIcon').classList.add('active');
-                document.getElementById('lightIcon').classList.remove('active');
-            }
-            
-            // Load diseases
-            const diseases = DISEASE_LIST_JSON;
-            const diseaseList = document.getElementById('disease-list');
-            
-            let html = '';
-            diseases.forEach(disease => {
-                html += `<div>• ${disease}</div>`;
-            });
-            diseaseList.innerHTML = html;
-        });
-        
-        // Navigation
-        function showPage(pageName) {
-            document.querySelectorAll('.page').forEach(page => {
-                page.classList.remove('active');
-            });
-            
-            document.querySelectorAll('.nav-link').forEach(link => {
-                link.classList.remove('active');
-            });
-            
-            document.getElementById(pageName).classList.add('active');
-            event.target.closest('.nav-link').classList.add('active');
-            
-            if (pageName === 'history') {
-                loadHistory();
-            }
-        }
-        
-        function fillExample(text) {
-            document.getElementById('symptoms').value = text;
-        }
-        
-        async function predict() {
-            const symptoms = document.getElementById('symptoms').value.trim();
-            
-            if (!symptoms) {
-                alert('⚠️ Please describe your symptoms');
-                return;
-            }
-            
-            if (!modelLoaded) {
-                alert('❌ Model not loaded. Please check Overview page for instructions.');
-                return;
-            }
-            
-            const resultSection = document.getElementById('results');
-            const resultContent = document.getElementById('resultContent');
-            
-            resultContent.innerHTML = `
-                <div class="loader">
-                    <div class="spinner"></div>
-                    <p style="color: #667eea; font-size: 18px; font-weight: 600;">Analyzing symptoms...</p>
-                    <small style="color: var(--text-secondary);">This may take a few seconds</small>
-                </div>
-            `;
-            resultSection.classList.add('show');
-            
-            try {
-                const response = await fetch('/predict', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ symptoms: symptoms })
-                });
-                
-                const data = await response.json();
-                
-                if (data.error) {
-                    throw new Error(data.error);
-                }
-                
-                const top = data.predictions[0];
-                const confidence = (top.confidence * 100);
-                
-                let html = `
-                    <div class="primary-result">
-                        <h3>🎯 Most Likely: ${top.disease}</h3>
-                        <div style="font-size: 18px; margin-top: 10px;">
-                            Confidence: ${confidence.toFixed(2)}%
-                        </div>
-                        <div class="confidence-bar">
-                            <div class="confidence-fill" style="width: ${confidence}%"></div>
-                        </div>
-                    </div>
-                    
-                    <div class="predictions-list">
-                        <h3>📊 Top 5 Predictions:</h3>
-                `;
-                
-                data.predictions.forEach((pred, index) => {
-                    const conf = (pred.confidence * 100);
-                    html += `
-                        <div class="prediction-item">
-                            <strong>${index + 1}. ${pred.disease}</strong>
-                            <small>Confidence: ${conf.toFixed(4)}%</small>
-                            <div class="prediction-bar">
-                                <div class="prediction-bar-fill" style="width: ${conf}%"></div>
-                            </div>
-                        </div>
-                    `;
-                });
-                
-                html += `
-                    </div>
-                    <div class="warning">
-                        <strong><i class="fas fa-exclamation-triangle"></i> Medical Disclaimer:</strong>
-                        This AI analysis is for informational purposes only. Always consult a qualified healthcare professional.
+                        🫁 <strong>Asthma:</strong> Breathing difficulty, wheezing, chest tightness
                     </div>
-                `;
+                </div>
                 
-                resultContent.innerHTML = html;
+                <label for="symptoms">
+                    <i class="fas fa-notes-medical"></i> Describe your symptoms in detail:
+                </label>
+                <textarea 
+                    id="symptoms" 
+                    placeholder="Be as detailed as possible. Example: I have been experiencing high fever (102°F) for the past 3 days, along with severe headache, body aches, extreme weakness, and dry cough..."
+                ></textarea>
                 
-                // Update counter
-                const current = parseInt(document.getElementById('total-predictions').textContent);
-                document.getElementById('total-predictions').textContent = current + 1;
+                <button onclick="predict()" id="predictBtn">
+                    <i class="fas fa-magic"></i> Analyze Symptoms
+                </button>
                 
-            } catch (error) {
-                resultContent.innerHTML = `
-                    <div style="padding: 25px; background: #ffebee; border-radius: 15px; border-left: 5px solid #f44336;">
-                        <strong style="color: #c62828; font-size: 18px;">
-                            <i class="fas fa-times-circle"></i> Error:
-                        </strong>
-                        <p style="margin-top: 10px; color: #666;">${error.message}</p>
-                    </div>
-                `;
-            }
-        }
+                <div class="result-section" id="results">
+                    <div id="resultContent"></div>
+                </div>
+            </div>
+        </div>
         
-        async function loadHistory() {
-            try {
-                const response = await fetch('/history');
-                const data = await response.json();
-                
-                const historyContent = document.getElementById('historyContent');
-                
-                if (!data.history || data.history.length === 0) {
-                    historyContent.innerHTML = `
-                        <p style="text-align: center; color: var(--text-secondary); padding: 40px;">
-                            No predictions yet. Try the Predict Disease page!
-                        </p>
-                    `;
-                    return;
-                }
-                
-                let html = `
-                    <table>
-                        <thead>
-                            <tr>
-                                <th>Date & Time</th>
-                                <th>Symptoms</th>
-                                <th>Prediction</th>
-                                <th>Confidence</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-                `;
-                
-                data.history.slice().reverse().forEach(item => {
-                    const time = new Date(item.timestamp).toLocaleString();
-                    const symptoms = item.symptoms.length > 60 
-                        ? item.symptoms.substring(0, 60) + '...' 
-                        : item.symptoms;
-                    const conf = (item.confidence * 100).toFixed(2);
-                    
-                    html += `
-                        <tr>
-                            <td>${time}</td>
-                            <td>${symptoms}</td>
-                            <td><strong>${item.prediction}</strong></td>
-                            <td>${conf}%</td>
-                        </tr>
-                    `;
-                });
-                
-                html += '</tbody></table>';
-                historyContent.innerHTML = html;
-                
-            } catch (error) {
-                console.error('Error loading history:', error);
-            }
-        }
+        <!-- History Page -->
+        <div id="history" class="page">
+            <div class="page-header">
+                <h1>📋 Prediction History</h1>
+                <p>Your recent symptom analyses</p>
+            </div>
+            
+            <div class="card">
+                <div class="card-header">
+                    <span><i class="fas fa-history"></i> Recent Assessments</span>
+                    <button class="btn btn-primary" onclick="loadHistory()">
+                        <i class="fas fa-sync"></i> Refresh
+                    </button>
+                </div>
+                <div id="historyContent">
+                    <p style="text-align: center; color: var(--text-secondary); padding: 40px;">
+                        No predictions yet. Try the Predict Disease page!
+                    </p>
+                </div>
+            </div>
+        </div>
+    </main>
+    
+    <script>
+        let modelLoaded = MODEL_LOADED_VALUE;
+        const DISEASES = DISEASE_LIST_JSON;
     </script>
+    <script src="STATIC_APP_JS"></script>
 </body>
 </html>"""
 
+# ==================== STATIC ASSETS ====================
+# CSS, JS and the icon font are served from memory under content-hashed
+# URLs, so they can be cached forever: any change gives a new URL. The
+# table is built once, on first use or by prerender_index() at startup.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+# Font Awesome 6.4.0 Free Solid webfont, already cut down to ICON_CODEPOINTS
+# (SIL OFL 1.1, see static/fa-LICENSE.txt). After adding an icon, point
+# --icon-font at the full fa-solid-900.woff2 from the Font Awesome Free
+# release, or re-subset it into static/. If the file is missing the page
+# falls back to the CDN.
+ICON_FONT = os.path.join(STATIC_DIR, 'fa-solid-900.woff2')
+ICON_FONT_CDN = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css'
+STATIC_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CONTENT_ENCODINGS = ('br', 'gzip')   # preferred first; br only if the brotli package is installed
+
+# Every fa-* icon the page uses (Font Awesome 6 codepoints)
+ICON_CODEPOINTS = {
+    'fa-bullseye': 0xf140,
+    'fa-chart-bar': 0xf080,
+    'fa-check-circle': 0xf058,
+    'fa-code-branch': 0xf126,
+    'fa-comment-medical': 0xf7f5,
+    'fa-exclamation-triangle': 0xf071,
+    'fa-heartbeat': 0xf21e,
+    'fa-history': 0xf1da,
+    'fa-home': 0xf015,
+    'fa-info-circle': 0xf05a,
+    'fa-lightbulb': 0xf0eb,
+    'fa-magic': 0xf0d0,
+    'fa-moon': 0xf186,
+    'fa-notes-medical': 0xf481,
+    'fa-spinner': 0xf110,
+    'fa-stethoscope': 0xf0f1,
+    'fa-sun': 0xf185,
+    'fa-sync': 0xf021,
+    'fa-times-circle': 0xf057,
+    'fa-viruses': 0xe076,
+}
+
+static_assets = {}     # URL -> (content type, {encoding: (body, etag)})
+static_urls = {}       # asset name -> fingerprinted URL
+static_lock = threading.Lock()
+
+def compressed_bodies(body, tag):
+    """
+    body in every available encoding: {encoding: (bytes, etag)} with
+    'identity' always present
+    """
+    bodies = {'identity': body, 'gzip': gzip.compress(body, 9, mtime=0)}
+    try:
+        import brotli
+        bodies['br'] = brotli.compress(body, quality=11)
+    except ImportError:
+        pass
+    # One ETag per representation, as each encoding is different bytes
+    return {encoding: (data, f'"{tag}-{encoding}"') for encoding, data in bodies.items()}
+
+def add_static_asset(name, body, content_type, compress=True):
+    digest = hashlib.sha256(body).hexdigest()[:12]
+    stem, ext = os.path.splitext(name)
+    url = f'/static/{stem}.{digest}{ext}'
+    bodies = compressed_bodies(body, digest) if compress else {'identity': (body, f'"{digest}"')}
+    static_assets[url] = (content_type, bodies)
+    static_urls[name] = url
+    return url
+
+def subset_icon_font(path):
+    """
+    Cut the icon font down to the glyphs in ICON_CODEPOINTS. Returns
+    (font bytes, format). Without fontTools the whole font is served.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    full_format = {'.woff2': 'woff2', '.woff': 'woff', '.ttf': 'truetype'}.get(os.path.splitext(path)[1], 'woff2')
+    try:
+        import io
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+        
+        font = TTFont(io.BytesIO(data))
+        subsetter = subset.Subsetter(subset.Options())
+        subsetter.populate(unicodes=ICON_CODEPOINTS.values())
+        subsetter.subset(font)
+        try:
+            import brotli  # noqa: F401 - needed for woff2
+            font.flavor = 'woff2'
+        except ImportError:
+            font.flavor = 'woff'
+        out = io.BytesIO()
+        font.save(out)
+        return out.getvalue(), font.flavor
+    except ImportError:
+        return data, full_format
+
+def icon_css(font_url, font_format):
+    rules = [
+        '@font-face { font-family: "Font Awesome 6 Free"; font-style: normal; font-weight: 900; '
+        f'font-display: block; src: url("{font_url}") format("{font_format}"); }}',
+        '.fas { font-family: "Font Awesome 6 Free"; font-weight: 900; font-style: normal; '
+        'display: inline-block; line-height: 1; -webkit-font-smoothing: antialiased; }',
+        '.fa-spin { animation: fa-spin 2s linear infinite; }',
+        '@keyframes fa-spin { from { transform: rotate(0deg); } to { transform: rotate(360deg); } }',
+    ]
+    for name, codepoint in ICON_CODEPOINTS.items():
+        rules.append(f'.{name}::before {{ content: "\\{codepoint:x}"; }}')
+    return '\n'.join(rules) + '\n'
+
+def build_static_assets():
+    with static_lock:
+        if static_urls:
+            return
+        add_static_asset('app.css', PAGE_CSS.encode(), 'text/css; charset=utf-8')
+        add_static_asset('app.js', PAGE_JS.encode(), 'application/javascript; charset=utf-8')
+        
+        if os.path.exists(ICON_FONT):
+            font, font_format = subset_icon_font(ICON_FONT)
+            font_url = add_static_asset(f'icons.{font_format}', font, f'font/{font_format}', compress=False)
+            add_static_asset('icons.css', icon_css(font_url, font_format).encode(), 'text/css; charset=utf-8')
+        else:
+            print(f"⚠️  {ICON_FONT} not found - icons load from the Font Awesome CDN")
+
+def icon_stylesheet():
+    return f'<link rel="stylesheet" href="{static_urls.get("icons.css", ICON_FONT_CDN)}">'
+
+# ==================== INDEX PAGE ====================
+# GET / only ever serves one of three pages (model ready, loading, failed).
+# Each is rendered once, compressed once per encoding and served from
+# memory with an ETag; browsers revalidate (no-cache) because which variant
+# is current changes when the model finishes loading.
+INDEX_VARIANTS = {
+    'ready': {
+        'MODEL_STATUS_CLASS': 'success',
+        'MODEL_STATUS_ICON': 'fa-check-circle',
+        'MODEL_STATUS_TEXT': '✅ AI Model Loaded Successfully',
+        'MODEL_STATUS_DETAIL': 'System ready to analyze symptoms',
+        'MODEL_LOADED_VALUE': 'true',
+    },
+    'loading': {
+        'MODEL_STATUS_CLASS': 'loading',
+        'MODEL_STATUS_ICON': 'fa-spinner fa-spin',
+        'MODEL_STATUS_TEXT': '⏳ AI Model Loading...',
+        'MODEL_STATUS_DETAIL': 'This page will update when the model is ready',
+        'MODEL_LOADED_VALUE': 'false',
+    },
+    'failed': {
+        'MODEL_STATUS_CLASS': 'error',
+        'MODEL_STATUS_ICON': 'fa-times-circle',
+        'MODEL_STATUS_TEXT': '❌ Model Not Loaded',
+        'MODEL_STATUS_DETAIL': 'Install: pip install transformers torch',
+        'MODEL_LOADED_VALUE': 'false',
+    },
+}
+
+index_pages = {}
+index_lock = threading.Lock()
+
+def render_index(variant):
+    """
+    The page for one variant, compressed with every available encoding:
+    {encoding: (body, etag)} with 'identity' always present
+    """
+    build_static_assets()
+    html = HTML.replace('DISEASE_LIST_JSON', json.dumps(list(id2label.values())))
+    html = html.replace('ICON_STYLESHEET', icon_stylesheet())
+    html = html.replace('STATIC_APP_CSS', static_urls['app.css'])
+    html = html.replace('STATIC_APP_JS', static_urls['app.js'])
+    for placeholder, value in INDEX_VARIANTS[variant].items():
+        html = html.replace(placeholder, value)
+    body = html.encode()
+    return compressed_bodies(body, f'{variant}-{hashlib.sha1(body).hexdigest()[:16]}')
+
+def prerender_index():
+    for variant in INDEX_VARIANTS:
+        index_page(variant)
+
+def index_page(variant):
+    page = index_pages.get(variant)
+    if page is None:
+        with index_lock:
+            page = index_pages.get(variant)
+            if page is None:
+                page = index_pages[variant] = render_index(variant)
+    return page
+
+def current_index_variant():
+    if model_loaded:
+        return 'ready'
+    return 'loading' if model_status == 'loading' else 'failed'
+
+def accepted_encodings(header):
+    """
+    Content codings the client accepts (q > 0) from an Accept-Encoding header
+    """
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding)
+    return accepted
+
+def choose_encoding(header, available):
+    accepted = accepted_encodings(header)
+    for encoding in CONTENT_ENCODINGS:
+        if encoding in available and (encoding in accepted or '*' in accepted):
+            return encoding
+    return 'identity'
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # Weak comparison, as If-None-Match requires
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
 # ==================== WEB SERVER ====================
+LOADING_RETRY_AFTER = 5   # seconds, sent with 503s while the model loads
+LOG_PREDICTIONS = True    # print every prediction to the console (--quiet turns it off)
+KEEPALIVE_TIMEOUT = 30    # seconds an idle keep-alive connection is held open
+CORS_MAX_AGE = 86400      # seconds browsers may cache a preflight answer
+BODY_DRAIN_LIMIT = 65536  # unread request bodies up to this size are skipped to keep the connection
+PREDICT_MAX_BODY = 256 * 1024          # bytes; MAX_INPUT_CHARS of text plus JSON overhead fits easily
+BATCH_MAX_BODY = 256 * 1024 * 1024     # bytes on the wire (texts are parsed as they stream in)
+BATCH_MAX_DECODED = 256 * 1024 * 1024  # bytes once Content-Encoding is undone (a gzip bomb stops here)
+BATCH_MAX_STREAMS = 4     # concurrent /predict/batch requests; more get a 503
+OVERLOAD_RETRY_AFTER = 1  # seconds, sent with 503s when the queue is full
+DEADLINE_HEADER = 'X-Deadline-Ms'   # time budget for the request, in ms from arrival
+
+batch_streams = threading.BoundedSemaphore(BATCH_MAX_STREAMS)
+
+def parse_deadline(value, received):
+    """
+    time.monotonic() deadline from an X-Deadline-Ms header (None if absent)
+    """
+    if value is None:
+        return None
+    try:
+        budget = float(value)
+    except ValueError:
+        raise ValueError(f'{DEADLINE_HEADER} must be a number of milliseconds')
+    # nan and inf would reach Future.result() and Condition.wait() timeouts
+    if not math.isfinite(budget) or budget < 0:
+        raise ValueError(f'{DEADLINE_HEADER} must be a finite, non-negative number of milliseconds')
+    return received + budget / 1000.0
+
 class Handler(BaseHTTPRequestHandler):
+    # Persistent connections: every response is framed by Content-Length or
+    # chunked encoding, and idle connections are dropped after `timeout`
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    # Headers and body go out in separate writes; with Nagle on, the body
+    # of a reused connection waits for the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+    
+    def handle_one_request(self):
+        # Timing starts in parse_request, so waiting for a request line
+        # on an idle connection is not counted as request time
+        self.metrics_started = None
+        self.status = 0
+        self.body_pending = False
+        self.body_taken = False
+        self.chunked = False
+        try:
+            super().handle_one_request()
+        finally:
+            # Unread request bytes would be parsed as the next request
+            if self.body_pending:
+                self.close_connection = True
+            if self.metrics_started is not None:
+                path = urlsplit(getattr(self, 'path', '')).path
+                metrics.request_finished(path, self.status or 500, time.perf_counter() - self.metrics_started)
+    
+    def parse_request(self):
+        self.metrics_started = time.perf_counter()
+        metrics.request_started()
+        if not super().parse_request():
+            return False
+        self.body_pending = bool(self.headers.get('Transfer-Encoding')) or \
+            self.headers.get('Content-Length', '0').strip() not in ('', '0')
+        return True
+    
+    def request_body(self):
+        """
+        The request body as a BodyReader bounded by Content-Length. Once it
+        is read to the end the connection can be reused.
+        """
+        if self.headers.get('Transfer-Encoding'):
+            raise ValueError('Chunked request bodies are not supported, send Content-Length')
+        self.body_taken = True
+        body = BodyReader(self.rfile, int(self.headers.get('Content-Length') or 0))
+        body.on_done = self.body_read
+        if body.remaining <= 0:
+            self.body_read()
+        return body
+    
+    def body_read(self):
+        self.body_pending = False
+    
+    def end_headers(self):
+        # Answered without looking at the body (404, 503 while loading...):
+        # skip a small body so the connection stays usable, or tell the
+        # client this connection is done
+        if self.body_pending and not self.body_taken:
+            length = self.headers.get('Content-Length', '')
+            if not self.headers.get('Transfer-Encoding') and length.isdigit() and int(length) <= BODY_DRAIN_LIMIT:
+                self.rfile.read(int(length))
+                self.body_pending = False
+            else:
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+        super().end_headers()
+    
+    def send_empty(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def start_stream(self, content_type, headers=None):
+        """
+        200 with a body of unknown length: chunked on HTTP/1.1, otherwise
+        delimited by closing the connection
+        """
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.request_version == 'HTTP/1.1':
+            self.chunked = True
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+    
+    def write_stream(self, data):
+        if self.chunked:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        else:
+            self.wfile.write(data)
+        self.wfile.flush()
+    
+    def end_stream(self, trailers=None):
+        """
+        Finish a chunked body, with trailer fields if given (those need the
+        field names announced in a Trailer header by start_stream)
+        """
+        if self.chunked:
+            fields = ''.join(f'{name}: {value}\r\n' for name, value in (trailers or {}).items())
+            self.wfile.write(b'0\r\n' + fields.encode('latin-1', 'replace') + b'\r\n')
+            self.wfile.flush()
+    
+    def send_response(self, code, message=None):
+        self.status = code
+        super().send_response(code, message)
+    
     def do_GET(self):
-        if self.path == '/':
+        path = urlsplit(self.path).path
+        
+        if path == '/':
+            page = index_page(current_index_variant())
+            encoding = choose_encoding(self.headers.get('Accept-Encoding'), page)
+            body, etag = page[encoding]
+            
+            if etag_matches(self.headers.get('If-None-Match'), etag):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Vary', 'Accept-Encoding')
+                self.end_headers()
+                return
+            
             self.send_response(200)
             self.send_header('Content-type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            if encoding != 'identity':
+                self.send_header('Content-Encoding', encoding)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Vary', 'Accept-Encoding')
             self.end_headers()
-            
-            html = HTML
-            
-            if model_loaded:
-                html = html.replace('MODEL_STATUS_CLASS', 'success')
-                html = html.replace('MODEL_STATUS_ICON', 'fa-check-circle')
-                html = html.replace('MODEL_STATUS_TEXT', '✅ AI Model Loaded Successfully')
-                html = html.replace('MODEL_STATUS_DETAIL', 'System ready to analyze symptoms')
-                html = html.replace('MODEL_LOADED_VALUE', 'true')
+            self.wfile.write(body)
+        
+        elif path.startswith('/static/'):
+            self.send_static(path)
+        
+        elif path == '/labels':
+            # Name for every label id used by the binary formats; changes
+            # only with the label set, so it can be cached
+            etag = f'"labels-{LABELS_VERSION}"'
+            headers = {'ETag': etag, 'Cache-Control': 'public, max-age=86400', 'X-Labels-Version': LABELS_VERSION}
+            if etag_matches(self.headers.get('If-None-Match'), etag):
+                self.send_empty(304, headers)
             else:
-                html = html.replace('MODEL_STATUS_CLASS', 'error')
-                html = html.replace('MODEL_STATUS_ICON', 'fa-times-circle')
-                html = html.replace('MODEL_STATUS_TEXT', '❌ Model Not Loaded')
-                html = html.replace('MODEL_STATUS_DETAIL', 'Install: pip install transformers torch')
-                html = html.replace('MODEL_LOADED_VALUE', 'false')
-            
-            diseases_json = json.dumps(list(id2label.values()))
-            html = html.replace('DISEASE_LIST_JSON', diseases_json)
-            
-            self.wfile.write(html.encode())
+                self.send_json({'version': LABELS_VERSION, 'labels': DISEASE_NAMES}, headers=headers)
+        
+        elif path == '/healthz':
+            # Liveness: the process is up and answering, model or not
+            self.send_json({'status': 'ok'})
+        
+        elif path == '/readyz':
+            # Readiness: only 200 once predictions can be served
+            if model_status == 'ready':
+                self.send_json({'status': 'ready', 'model': model_name})
+            else:
+                self.send_json({'status': model_status, 'error': model_error}, 503,
+                               {'Retry-After': str(LOADING_RETRY_AFTER)} if model_status == 'loading' else None)
+        
+        elif path == '/history':
+            # ?limit=N, then ?cursor=<next_cursor> for older pages or
+            # ?since=<latest> for entries added since the last call
+            try:
+                query = parse_history_query(urlsplit(self.path).query)
+            except ValueError as e:
+                self.send_json({'error': str(e)}, 400)
+                return
+            self.send_json(history.page(**query))
+        
+        elif path == '/history/stream':
+            self.history_stream()
+        
+        elif path == '/stats':
+            self.send_json({
+                'batching': batcher.stats(),
+                'cache': prediction_cache.stats(),
+                'padding': dict(padding_stats),
+                'long_inputs': dict(long_input_stats),
+                'history': history.stats(),
+                'clients': {client.name: client.stats() for client in all_clients()},
+                'process': {'pid': os.getpid(), 'memory': read_memory(os.getpid())}
+            })
         
-        elif self.path == '/history':
-            self.send_json({'history': prediction_history})
+        elif path == '/metrics':
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
         
         else:
-            self.send_response(404)
+            self.send_empty(404)
+    
+    def send_static(self, path):
+        build_static_assets()
+        asset = static_assets.get(path)
+        if asset is None:
+            self.send_empty(404)
+            return
+        
+        content_type, bodies = asset
+        encoding = choose_encoding(self.headers.get('Accept-Encoding'), bodies)
+        body, etag = bodies[encoding]
+        
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', STATIC_CACHE_CONTROL)
             self.end_headers()
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', STATIC_CACHE_CONTROL)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def history_stream(self):
+        """
+        GET /history/stream[?since=<id>] - Server-Sent Events, one event
+        per history entry newer than `since` (default: only entries recorded
+        from now on). A reconnecting browser sends Last-Event-ID and picks
+        up where it left off.
+        """
+        try:
+            since = self.headers.get('Last-Event-ID') or parse_qs(urlsplit(self.path).query).get('since', [None])[0]
+            since = history.latest_id() if since is None else int(since)
+        except ValueError:
+            self.send_json({'error': "'since' must be an integer"}, 400)
+            return
+        
+        if not history.open_stream():
+            self.send_json({'error': 'Too many history streams open'}, 503, {'Retry-After': str(HISTORY_STREAM_RETRY_AFTER)})
+            return
+        
+        try:
+            self.start_stream('text/event-stream', {'Cache-Control': 'no-cache', 'Access-Control-Allow-Origin': '*'})
+            
+            while True:
+                page = history.page(since=since, limit=HISTORY_MAX_PAGE_SIZE)
+                if page['history']:
+                    events = ''.join(f"id: {entry['id']}\ndata: {json.dumps(entry)}\n\n" for entry in page['history'])
+                    since = page['latest']
+                elif history.wait(since, HISTORY_STREAM_HEARTBEAT):
+                    continue
+                else:
+                    # Comment line: keeps proxies from timing the stream out
+                    # and notices clients that went away
+                    events = ': keep-alive\n\n'
+                self.write_stream(events.encode())
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass
+        finally:
+            history.close_stream()
+    
+    def body_rejected(self, limit):
+        """
+        Answer 411/413 for a body with no usable length or over `limit`,
+        before any of it is read. Returns True if a response was sent.
+        """
+        length = self.headers.get('Content-Length', '').strip()
+        if self.headers.get('Transfer-Encoding') or not length.isdigit():
+            self.send_json({'error': 'Content-Length is required'}, 411)
+            return True
+        if int(length) > limit:
+            self.send_json({'error': f'Request body is larger than {limit} bytes'}, 413)
+            return True
+        return False
+    
+    def identify_client(self):
+        """
+        The Client for this request's API key. Returns None after answering
+        401 for an unknown key (or a missing one when keys are required).
+        """
+        key = self.headers.get('X-API-Key')
+        authorization = self.headers.get('Authorization', '')
+        if not key and authorization.lower().startswith('bearer '):
+            key = authorization[7:].strip()
+        
+        if not key:
+            if REQUIRE_API_KEY:
+                self.send_json({'error': 'API key required'}, 401, {'WWW-Authenticate': 'Bearer'})
+                return None
+            return anonymous_client
+        
+        client = api_clients.get(key)
+        if client is None:
+            self.send_json({'error': 'Unknown API key'}, 401, {'WWW-Authenticate': 'Bearer'})
+        return client
+    
+    def rate_limited(self, retry_after):
+        self.send_json({'error': 'Rate limit exceeded'}, 429, {'Retry-After': str(max(1, math.ceil(retry_after)))})
+    
+    def overloaded(self, e):
+        self.send_json({'error': str(e)}, 503, {'Retry-After': str(OVERLOAD_RETRY_AFTER)})
+    
+    def model_unavailable(self):
+        """
+        Answer for the prediction routes when there is no model to use.
+        Returns True if a response was sent.
+        """
+        if model_status == 'loading':
+            self.send_json({'error': 'Model is still loading, try again shortly'}, 503,
+                           {'Retry-After': str(LOADING_RETRY_AFTER)})
+            return True
+        if not model_loaded or backend is None:
+            self.send_json({'error': 'Model not loaded'}, 500)
+            return True
+        return False
+    
+    def do_OPTIONS(self):
+        """
+        CORS preflight. The answer is the same for every path, so browsers
+        may cache it for CORS_MAX_AGE.
+        """
+        self.send_empty(204, {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': self.headers.get('Access-Control-Request-Headers') or 'Content-Type',
+            'Access-Control-Max-Age': str(CORS_MAX_AGE),
+        })
     
     def do_POST(self):
-        if self.path == '/predict':
+        path = urlsplit(self.path).path
+        
+        if path == '/predict':
+            received = time.monotonic()
+            if self.model_unavailable() or self.body_rejected(PREDICT_MAX_BODY):
+                return
+            
+            client = self.identify_client()
+            if client is None:
+                return
+            
+            try:
+                deadline = parse_deadline(self.headers.get(DEADLINE_HEADER), received)
+            except ValueError as e:
+                self.send_json({'error': str(e)}, 400)
+                return
+            
+            retry_after = client.admit()
+            if retry_after:
+                self.rate_limited(retry_after)
+                return
+            
             try:
-                content_length = int(self.headers['Content-Length'])
-                post_data = self.rfile.read(content_length)
-                data = json.loads(post_data.decode('utf-8'))
+                started = time.perf_counter()
+                post_data = self.request_body().read()
+                try:
+                    data = json.loads(post_data.decode('utf-8'))
+                except ValueError:
+                    self.send_json({'error': 'Request body must be JSON'}, 400)
+                    return
+                metrics.observe('parse', time.perf_counter() - started)
                 
-                symptoms = data.get('symptoms', '')
+                symptoms = data.get('symptoms', '') if isinstance(data, dict) else None
+                if not isinstance(symptoms, str):
+                    self.send_json({'error': 'Request body must be {"symptoms": "..."}'}, 400)
+                    return
                 
-                if not model_loaded or clf is None:
-                    self.send_json({'error': 'Model not loaded'}, 500)
+                try:
+                    k = parse_top_k(data.get('top_k'))
+                except ValueError as e:
+                    self.send_json({'error': str(e)}, 400)
                     return
                 
-                print(f"\n🔍 Analyzing: {symptoms[:60]}...")
+                fmt = response_format(self.headers.get('Accept'))
+                if fmt == 'float32':
+                    k = len(DISEASE_NAMES)   # the vector holds every score
                 
-                result = predict_disease(symptoms)
+                if LOG_PREDICTIONS:
+                    print(f"\n🔍 Analyzing: {symptoms[:60]}...")
+                
+                if deadline is not None and deadline <= time.monotonic():
+                    raise DeadlineExceeded('Deadline passed before the request was queued')
+                
+                profile_id = None
+                profiling = should_profile(self.headers)
+                if profiling:
+                    try:
+                        result, profile_id = profile_prediction(symptoms, k)
+                    except ProfileBusy as e:
+                        if profiling == 'requested':
+                            self.send_json({'error': str(e)}, 409)
+                            return
+                        profiling = None   # a sampled request just goes unprofiled
+                if not profiling:
+                    result = prediction_cache.predict(
+                        symptoms, lambda text, k: batcher.predict(text, k, deadline, client), k,
+                        deadline, client.priority)
                 
                 if 'error' in result:
                     self.send_json(result, 400)
                     return
                 
-                prediction_history.append({
-                    'timestamp': datetime.now().isoformat(),
-                    'symptoms': symptoms,
-                    'prediction': result['predictions'][0]['disease'],
-                    'confidence': result['predictions'][0]['confidence']
-                })
+                record_prediction(symptoms, result)
                 
-                if len(prediction_history) > 50:
-                    prediction_history.pop(0)
+                if LOG_PREDICTIONS:
+                    print(f"✅ Top: {result['predictions'][0]['disease']} ({result['predictions'][0]['confidence']:.4f})")
                 
-                print(f"✅ Top: {result['predictions'][0]['disease']} ({result['predictions'][0]['confidence']:.4f})")
-                
-                self.send_json(result)
+                headers = {'X-Profile-Id': profile_id} if profile_id else {}
+                if fmt == 'json':
+                    headers['X-Labels-Version'] = LABELS_VERSION
+                    self.send_json(result, headers=headers)
+                else:
+                    self.send_binary(encode_result(result, fmt), fmt, headers)
+                client.latency.observe(time.monotonic() - received)
                 
+            except Overloaded as e:
+                self.overloaded(e)
+            except DeadlineExceeded as e:
+                self.send_json({'error': str(e)}, 504)
             except Exception as e:
                 print(f"❌ Error: {str(e)}")
                 import traceback
                 traceback.print_exc()
                 self.send_json({'error': str(e)}, 500)
+        
+        elif path == '/predict/batch':
+            if not batch_streams.acquire(blocking=False):
+                self.overloaded(f'Too many batch requests in progress ({BATCH_MAX_STREAMS})')
+                return
+            try:
+                self.predict_batch()
+            finally:
+                batch_streams.release()
+        
+        else:
+            self.send_empty(404)
+    
+    def predict_batch(self):
+        """
+        POST /predict/batch[?top_k=N] - body is a JSON array or NDJSON of
+        symptom texts (optionally Content-Encoding: gzip). Results are
+        streamed back as NDJSON, one line per input, as soon as each chunk
+        has been scored. With a packed Accept type the stream is msgpack
+        maps (with 'index') back to back, or one float32 vector per input.
+        """
+        received = time.monotonic()
+        if self.model_unavailable() or self.body_rejected(BATCH_MAX_BODY):
+            return
+        
+        client = self.identify_client()
+        if client is None:
+            return
+        
+        try:
+            k = parse_top_k(parse_qs(urlsplit(self.path).query).get('top_k', [None])[0])
+            deadline = parse_deadline(self.headers.get(DEADLINE_HEADER), received)
+        except ValueError as e:
+            self.send_json({'error': str(e)}, 400)
+            return
+        
+        # Only refused up front when the bucket is empty; after that the
+        # stream is slowed down to the client's rate instead
+        retry_after = client.admit()
+        if retry_after:
+            self.rate_limited(retry_after)
+            return
+        
+        fmt = response_format(self.headers.get('Accept'))
+        if fmt == 'float32':
+            k = len(DISEASE_NAMES)
+        
+        body = self.request_body()
+        if self.headers.get('Content-Encoding', '').lower() == 'gzip':
+            body = gzip.GzipFile(fileobj=body)
+        
+        texts = iter_batch_texts(body, max_bytes=BATCH_MAX_DECODED)
+        
+        # Parse the first chunk before committing to a 200, so an obviously
+        # bad body still gets a normal JSON error
+        chunks = iter_chunks(texts, STREAM_CHUNK_SIZE)
+        try:
+            first = next(chunks, [])
+        except (ValueError, OSError, EOFError, zlib.error) as e:
+            self.send_json({'error': f'Bad batch body: {e}'}, 400)
+            return
+        
+        content_type = {'json': 'application/x-ndjson', 'msgpack': MSGPACK_TYPE, 'float32': FLOAT32_TYPE}[fmt]
+        headers = {'Access-Control-Allow-Origin': '*', 'X-Labels-Version': LABELS_VERSION}
+        te = {part.split(';')[0].strip().lower() for part in self.headers.get('TE', '').split(',')}
+        send_trailer = fmt == 'float32' and self.request_version == 'HTTP/1.1' and 'trailers' in te
+        if send_trailer:
+            headers['Trailer'] = STREAM_ERROR_TRAILER
+        self.start_stream(content_type, headers)
+        trailers = {}
+        
+        def stream_error(index, message):
+            # Too late for a status code. A float32 row would be taken for
+            # the next input's scores, so that format only ends short, with
+            # the reason in a trailer if the client accepts one
+            if fmt == 'float32':
+                if send_trailer:
+                    trailers[STREAM_ERROR_TRAILER] = ' '.join(message.split())
+            else:
+                self.write_stream(encode(index, {'error': message}))
+        
+        def encode(index, result):
+            if fmt == 'json':
+                return (json.dumps(dict(index=index, **result)) + '\n').encode()
+            if fmt == 'msgpack':
+                result = dict(index=index, **result)
+            return encode_result(result, fmt)
+        
+        index = 0
+        total = 0
+        chunk = first
+        while chunk:
+            if deadline is not None and deadline <= time.monotonic():
+                # The rest of the input is not scored once the caller's budget is spent
+                stream_error(index, 'Deadline exceeded')
+                break
+            try:
+                results = self.score_chunk(chunk, k, deadline, client)
+            except (DeadlineExceeded, Overloaded) as e:
+                stream_error(index, str(e))
+                break
+            parts = []
+            for result in results:
+                parts.append(encode(index, result))
+                index += 1
+            self.write_stream(b''.join(parts))
+            total += len(chunk)
+            
+            try:
+                chunk = next(chunks, [])
+            except (ValueError, OSError, EOFError, zlib.error) as e:
+                stream_error(index, f'Bad batch body: {e}')
+                break
+        self.end_stream(trailers)
+        
+        if LOG_PREDICTIONS:
+            print(f"📦 Batch: {total} texts scored")
+    
+    def score_chunk(self, chunk, k, deadline, client):
+        """
+        Score one batch-stream chunk through the micro-batcher, so it is
+        scheduled fairly against /predict traffic. Waits (up to
+        STREAM_QUEUE_WAIT, or the deadline) for room in a full queue rather
+        than failing a stream half way through.
+        """
+        pause = client.throttle(len(chunk))
+        if pause:
+            time.sleep(pause)
+        wait = STREAM_QUEUE_WAIT
+        if deadline is not None:
+            wait = min(wait, max(0.0, deadline - time.monotonic()))
+        try:
+            return batcher.submit(chunk, k, deadline, client, wait).result()
+        except Overloaded:
+            if deadline is not None and deadline <= time.monotonic():
+                raise DeadlineExceeded('Deadline passed while waiting for room in the queue')
+            raise
+    
+    def send_binary(self, body, fmt, headers=None):
+        started = time.perf_counter()
+        self.send_response(200)
+        self.send_header('Content-type', MSGPACK_TYPE if fmt == 'msgpack' else FLOAT32_TYPE)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('X-Labels-Version', LABELS_VERSION)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        metrics.observe('send_binary', time.perf_counter() - started)
     
-    def send_json(self, data, status=200):
+    def send_json(self, data, status=200, headers=None):
+        started = time.perf_counter()
         self.send_response(status)
         self.send_header('Content-type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        body = json.dumps(data).encode()
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
+        metrics.observe('send_json', time.perf_counter() - started)
     
     def log_message(self, format, *args):
-        if "POST /predict" in format % args:
+        message = format % args
+        # Per-request lines for the API, and idle keep-alive connections timing out
+        if "POST /predict" in message or message.startswith('Request timed out'):
             return
-        print(f"[{self.date_time_string()}] {format % args}")
+        print(f"[{self.date_time_string()}] {message}")
+
+class HealthServer(ThreadingHTTPServer):
+    """
+    One thread per connection, so GET / and GET /history answer straight away
+    while a prediction is running. The model itself only ever runs on the
+    batcher thread, so inference stays bounded no matter how many clients
+    are connected.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+# ==================== PRE-FORK WORKERS ====================
+def read_memory(pid):
+    """
+    RSS / PSS / unique (private) memory of one process in MB, from /proc.
+    Unique memory is what the process would give back if it exited, so it
+    is the number that shows whether the model weights are really shared.
+    """
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    
+    kb = lambda *names: sum(fields.get(n, 0) for n in names) / 1024
+    return {
+        'rss_mb': round(kb('Rss'), 1),
+        'pss_mb': round(kb('Pss'), 1),
+        'unique_mb': round(kb('Private_Clean', 'Private_Dirty'), 1),
+        'shared_mb': round(kb('Shared_Clean', 'Shared_Dirty'), 1)
+    }
+
+def memory_report(master_pid, worker_pids):
+    """
+    Print per-process memory so we can check that N workers do not cost
+    N x the model size
+    """
+    print("\n" + "="*60)
+    print("🧠 MEMORY REPORT (MB)")
+    print("="*60)
+    print(f"{'process':<16}{'pid':>8}{'rss':>9}{'pss':>9}{'unique':>9}{'shared':>9}")
+    
+    workers_unique = 0.0
+    workers_rss = 0.0
+    for name, pid in [('master', master_pid)] + [(f'worker {i}', p) for i, p in enumerate(worker_pids)]:
+        mem = read_memory(pid)
+        if mem is None:
+            print(f"{name:<16}{pid:>8}   (not available)")
+            continue
+        if pid != master_pid:
+            workers_unique += mem['unique_mb']
+            workers_rss += mem['rss_mb']
+        print(f"{name:<16}{pid:>8}{mem['rss_mb']:>9}{mem['pss_mb']:>9}{mem['unique_mb']:>9}{mem['shared_mb']:>9}")
+    
+    print("-"*60)
+    print(f"Workers, sum of RSS:    {workers_rss:.1f} MB (shared pages counted once per worker)")
+    print(f"Workers, sum of unique: {workers_unique:.1f} MB (real extra cost of the workers)")
+    print("="*60 + "\n")
+
+def serve_prefork(server, workers, compile_mode=None, warmup=False):
+    """
+    Fork workers that all accept on the master's listening socket. The model
+    must already be loaded (and converted to its precision), so its weights
+    are shared copy-on-write. The
+    master never runs a forward pass itself: torch's thread pools do not
+    survive fork(), so all inference happens in workers.
+    """
+    threads_per_worker = TORCH_THREADS or max(1, (os.cpu_count() or 1) // workers)
+    
+    # Move everything allocated so far out of the GC's reach, so collections
+    # in the workers do not write to (and un-share) those pages
+    import gc
+    gc.collect()
+    gc.freeze()
+    
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            for signum in (signal.SIGUSR1, signal.SIGTERM, signal.SIGHUP):
+                signal.signal(signum, signal.SIG_DFL)
+            if WORKER_CPUS:
+                pin_to_cpus(WORKER_CPUS[index % len(WORKER_CPUS)])
+            if 'torch' in sys.modules:
+                configure_torch(threads_per_worker)
+            try:
+                # Compile / warm up in each worker: torch thread pools started
+                # in the master would not survive the fork
+                if compile_mode or warmup:
+                    prepare_model(compile_mode, warmup)
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os._exit(0)
+        return pid
+    
+    pids = [spawn(i) for i in range(workers)]
+    master_pid = os.getpid()
+    stopping = False
+    
+    # kill -USR1 <master pid> prints the memory report again at any time
+    signal.signal(signal.SIGUSR1, lambda *_: memory_report(master_pid, pids))
+    
+    # kill / systemd / docker stop send SIGTERM (and a closed terminal
+    # SIGHUP) to the master only: treat them like Ctrl+C, so the workers are
+    # stopped rather than left holding the port
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGHUP, stop)
+    print(f"👷 Started {workers} workers ({threads_per_worker} torch threads each"
+          f"{', pinned to ' + str(WORKER_CPUS) if WORKER_CPUS else ''}): {pids}")
+    print(f"   kill -USR1 {master_pid} for a memory report")
+    
+    try:
+        time.sleep(2)
+        memory_report(master_pid, pids)
+        
+        while True:
+            pid, status = os.wait()
+            if pid in pids and not stopping:
+                print(f"⚠️  Worker {pid} exited (status {status}), restarting")
+                index = pids.index(pid)
+                pids[index] = spawn(index)
+    except KeyboardInterrupt:
+        stopping = True
+        # A second signal must not cut the shutdown short
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+            signal.signal(signum, signal.SIG_IGN)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        raise
 
 if __name__ == '__main__':
-    PORT = 5000
+    import argparse
+    
+    # The tuning file has to be read before the real parser is built, as it
+    # changes defaults; this parser only looks for the flags that matter
+    preparser = argparse.ArgumentParser(add_help=False)
+    preparser.add_argument('--tuning', default=TUNING_FILE)
+    preparser.add_argument('--workers', type=int)
+    preargs = preparser.parse_known_args()[0]
+    
+    # A tuning file only changes defaults: flags given explicitly still win.
+    # Its thread counts and CPU lists were measured for its own worker
+    # count, so they are dropped when --workers asks for something else.
+    tuning = load_tuning(preargs.tuning)
+    if tuning:
+        if preargs.workers is None:
+            TORCH_THREADS = tuning.get('torch_threads')
+            WORKER_CPUS = tuning.get('worker_cpus')
+        TORCH_INTEROP_THREADS = tuning.get('interop_threads')
+        BATCH_MAX_SIZE = tuning.get('batch_size', BATCH_MAX_SIZE)
+    
+    parser = argparse.ArgumentParser(description='Health Monitoring System web server')
+    parser.add_argument('--tuning', default=TUNING_FILE,
+                        help='thread / worker / batch size settings written by autotune.py (used if it exists)')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=BATCH_MAX_SIZE,
+                        help='largest batch sent to the model in one forward pass')
+    parser.add_argument('--batch-wait-ms', type=float, default=BATCH_MAX_WAIT_MS,
+                        help='how long to hold a request while waiting for others to batch with')
+    parser.add_argument('--workers', type=int, default=tuning.get('workers', 0) if tuning else 0,
+                        help='pre-fork this many worker processes sharing the loaded model (0 = single process)')
+    parser.add_argument('--max-queue', type=int, default=BATCH_MAX_QUEUE,
+                        help='requests allowed to wait for the model before new ones get a 503')
+    parser.add_argument('--api-keys', default=API_KEYS_FILE,
+                        help='JSON file of API keys with class / weight / rate per client (used if it exists)')
+    parser.add_argument('--require-api-key', action='store_true',
+                        help='refuse /predict requests that do not carry a known API key')
+    parser.add_argument('--anonymous-class', choices=PRIORITY_CLASSES, default=ANONYMOUS_CLASS,
+                        help='priority class of requests without an API key (the web page)')
+    parser.add_argument('--cache-size', type=int, default=CACHE_MAX_ENTRIES,
+                        help='max cached /predict results (0 disables the cache)')
+    parser.add_argument('--cache-mb', type=float, default=CACHE_MAX_MB,
+                        help='memory bound for the prediction cache')
+    parser.add_argument('--cache-ttl', type=float, default=CACHE_TTL_SECONDS,
+                        help='seconds a cached result stays valid')
+    parser.add_argument('--compile', choices=COMPILE_MODES,
+                        help='compile the model (torch.compile or a frozen TorchScript trace) at startup')
+    parser.add_argument('--warmup', action='store_true',
+                        help='run the model over representative shapes before reporting ready')
+    parser.add_argument('--precision', choices=PRECISION_MODES, default='fp32',
+                        help='int8 = dynamic quantization of Linear layers, bf16 = CPU autocast')
+    parser.add_argument('--max-input-chars', type=int, default=MAX_INPUT_CHARS,
+                        help='reject symptom texts longer than this before tokenizing them')
+    parser.add_argument('--window-tokens', type=int, default=WINDOW_TOKENS,
+                        help='token budget per forward pass; longer texts are split into windows')
+    parser.add_argument('--max-windows', type=int, default=MAX_WINDOWS,
+                        help='reject texts that would need more windows than this')
+    parser.add_argument('--backend', choices=tuple(BACKENDS), default='pytorch',
+                        help='runtime that executes the model (pipeline = original transformers pipeline path)')
+    parser.add_argument('--quiet', action='store_true',
+                        help='do not print every prediction to the console')
+    parser.add_argument('--history-db', default=HISTORY_DB,
+                        help='SQLite file prediction history is appended to ("" = keep it in memory only)')
+    parser.add_argument('--history-size', type=int, default=HISTORY_MAX_ENTRIES,
+                        help='newest history entries kept in memory and served from there')
+    parser.add_argument('--icon-font', default=ICON_FONT,
+                        help='Font Awesome 6 Free Solid font file to self-host (subset if fontTools is installed)')
+    parser.add_argument('--profile-rate', type=float, default=PROFILE_SAMPLE_RATE,
+                        help='fraction of /predict requests to profile (e.g. 0.001)')
+    parser.add_argument('--profile-token', default=os.environ.get('PROFILE_TOKEN'),
+                        help='clients sending "X-Profile: <token>" get their request profiled')
+    parser.add_argument('--profile-dir', default=PROFILE_DIR,
+                        help='where profiles are written')
+    args = parser.parse_args()
+    
+    PORT = args.port
+    LOG_PREDICTIONS = not args.quiet
+    MAX_INPUT_CHARS = args.max_input_chars
+    WINDOW_TOKENS = min(args.window_tokens, 512)
+    MAX_WINDOWS = args.max_windows
+    PROFILE_SAMPLE_RATE = args.profile_rate
+    PROFILE_TOKEN = args.profile_token
+    PROFILE_DIR = args.profile_dir
+    batcher = MicroBatcher(args.batch_size, args.batch_wait_ms, args.max_queue)
+    api_clients = load_api_keys(args.api_keys)
+    REQUIRE_API_KEY = args.require_api_key
+    anonymous_client = Client('anonymous', args.anonymous_class)
+    if args.workers > 0:
+        # Every worker keeps its own buckets: split each rate between them
+        for client in api_clients.values():
+            if client.bucket:
+                client.bucket.rate /= args.workers
+                client.bucket.capacity = max(1.0, client.bucket.capacity / args.workers)
+                client.bucket.tokens = client.bucket.capacity
+    prediction_cache = PredictionCache(args.cache_size, args.cache_mb, args.cache_ttl)
+    history = HistoryStore(args.history_size, args.history_db or None)
+    ICON_FONT = args.icon_font
+    prerender_index()
     
     print("\n" + "="*60)
     print("🌐 HEALTH MONITORING SYSTEM")
     print("="*60)
     print(f"URL: http://localhost:{PORT}")
-    print(f"Model: {'✅ LOADED' if model_loaded else '❌ NOT LOADED'}")
-    if model_loaded:
-        print(f"Diseases: {len(id2label)}")
-        print("✅ Ready to predict!")
-    else:
-        print("\n⚠️  Install: pip install transformers torch")
+    print(f"Model: {model_name} (loading in the background)")
+    print(f"Diseases: {len(id2label)}")
+    print(f"Batching: up to {batcher.max_batch_size} requests / {batcher.max_wait * 1000:g} ms")
+    print("Health: /healthz (alive)  /readyz (model ready)")
+    if api_clients:
+        print(f"API keys: {len(api_clients)} clients from {args.api_keys}"
+              f"{' (required)' if REQUIRE_API_KEY else ''}")
+    if tuning:
+        print(f"Tuning: {args.tuning} ({TORCH_THREADS} torch threads, {args.workers} workers)")
     print("="*60)
     print(f"\n🚀 Open: http://localhost:{PORT}")
     print("\nPress Ctrl+C to stop\n")
     
     try:
-        server = HTTPServer(('', PORT), Handler)
-        server.serve_forever()
+        # Bind first: clients connecting during model load queue up or get
+        # a 503 instead of "connection refused"
+        server = HealthServer(('', PORT), Handler)
+        
+        if args.workers > 0:
+            # Workers must be forked after the load to share the weights
+            # Precision is switched here, once: quantize_dynamic copies the
+            # weights, and a copy per worker would undo the sharing
+            load_model(precision=args.precision, backend_name=args.backend)
+            serve_prefork(server, args.workers, args.compile, args.warmup)
+        else:
+            if WORKER_CPUS:
+                pin_to_cpus(WORKER_CPUS[0])
+            load_model_in_background(args.compile, args.warmup, args.precision, args.backend)
+            server.serve_forever()
     except KeyboardInterrupt:
         print("\n\n👋 Server stopped\n")
@@ -0,0 +1,150 @@
+"""
+Thread / worker / batch size autotuner for the disease model.
+
+    python autotune.py                 # sweep and write tuning.json
+    python app.py                      # picks tuning.json up at startup
+
+For every combination of torch threads per process, worker processes per
+host and batch size, the real model is run on a standard symptom corpus
+for a few seconds, with each worker pinned to its own set of cores. The
+combination with the best total throughput (optionally under a latency
+limit) is written out together with the CPU list for every worker.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import app
+import bench
+
+# ==================== SWEEP ====================
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def split_cpus(cpus, workers, threads):
+    """
+    Give each worker its own block of `threads` neighbouring CPUs
+    """
+    return [cpus[i * threads:(i + 1) * threads] for i in range(workers)]
+
+def candidates(cpu_count, batch_sizes):
+    """
+    (workers, threads, batch size) combinations that never use more
+    threads than there are CPUs: each thread count once as a single
+    process and once filling the host with workers
+    """
+    threads = 1
+    combos = []
+    while threads <= cpu_count:
+        for workers in sorted({1, cpu_count // threads}):
+            for batch_size in batch_sizes:
+                combos.append((workers, threads, batch_size))
+        threads *= 2
+    return combos
+
+def run_worker(cpus, threads, batch_size, corpus, seconds, conn):
+    """
+    Score batches from the corpus for `seconds`; send back the number of
+    texts scored, the time taken and every batch latency
+    """
+    app.pin_to_cpus(cpus)
+    app.configure_torch(threads)
+
+    batches = [corpus[i:i + batch_size] for i in range(0, len(corpus), batch_size)]
+    app.predict_diseases(batches[0])   # warm up
+
+    done = 0
+    latencies = []
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        batch = batches[len(latencies) % len(batches)]
+        t0 = time.perf_counter()
+        app.predict_diseases(batch)
+        latencies.append(time.perf_counter() - t0)
+        done += len(batch)
+
+    conn.send((done, time.perf_counter() - started, latencies))
+    conn.close()
+
+def measure(workers, threads, batch_size, cpus, corpus, seconds):
+    """
+    Run `workers` processes side by side and return texts/s over all of
+    them and the p95 batch latency
+    """
+    ctx = multiprocessing.get_context('fork')
+    processes = []
+    for worker_cpus in split_cpus(cpus, workers, threads):
+        parent, child = ctx.Pipe(duplex=False)
+        process = ctx.Process(target=run_worker, args=(worker_cpus, threads, batch_size, corpus, seconds, child))
+        process.start()
+        processes.append((process, parent))
+
+    throughput = 0.0
+    latencies = []
+    for process, conn in processes:
+        done, elapsed, worker_latencies = conn.recv()
+        process.join()
+        throughput += done / elapsed
+        latencies.extend(worker_latencies)
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return throughput, p95
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the best torch threads / workers / batch size for this host')
+    parser.add_argument('-o', '--output', default=app.TUNING_FILE)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--seconds', type=float, default=3.0, help='measuring time per combination')
+    parser.add_argument('--corpus-size', type=int, default=256)
+    parser.add_argument('--max-p95-ms', type=float,
+                        help='only recommend combinations whose p95 batch latency stays under this')
+    args = parser.parse_args()
+
+    # Load only - the master must not run a forward pass before forking
+    if not app.load_model():
+        raise SystemExit("❌ Model not loaded - cannot tune")
+
+    cpus = available_cpus()
+    corpus = bench.mixed_corpus(args.corpus_size)
+    combos = candidates(len(cpus), args.batch_sizes)
+
+    print(f"\n🔧 Tuning on {len(cpus)} CPUs, {len(combos)} combinations x {args.seconds:g}s\n")
+    print(f"{'workers':>7} {'threads':>7} {'batch':>5} | {'texts/s':>9} {'p95 batch':>10}")
+
+    results = []
+    for workers, threads, batch_size in combos:
+        throughput, p95 = measure(workers, threads, batch_size, cpus, corpus, args.seconds)
+        results.append({'workers': workers, 'threads': threads, 'batch_size': batch_size,
+                        'texts_per_second': round(throughput, 1), 'p95_batch_ms': round(p95 * 1000, 1)})
+        print(f"{workers:>7} {threads:>7} {batch_size:>5} | {throughput:>9.1f} {p95 * 1000:>8.1f}ms")
+
+    allowed = [r for r in results if args.max_p95_ms is None or r['p95_batch_ms'] <= args.max_p95_ms]
+    if not allowed:
+        raise SystemExit(f"❌ No combination kept p95 under {args.max_p95_ms} ms")
+    best = max(allowed, key=lambda r: r['texts_per_second'])
+
+    tuning = {
+        'torch_threads': best['threads'],
+        'interop_threads': 1,
+        'workers': best['workers'] if best['workers'] > 1 else 0,
+        'batch_size': best['batch_size'],
+        'worker_cpus': split_cpus(cpus, best['workers'], best['threads']),
+        'measured': best,
+        'cpus': cpus,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'sweep': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(tuning, f, indent=2)
+
+    print(f"\n✅ Best: {best['workers']} workers x {best['threads']} threads, batch {best['batch_size']} "
+          f"-> {best['texts_per_second']} texts/s (p95 batch {best['p95_batch_ms']} ms)")
+    print(f"💾 Written to {args.output} - app.py applies it at startup")
+
+if __name__ == '__main__':
+    main()
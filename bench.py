@@ -0,0 +1,599 @@
+"""
+Benchmarks for the disease prediction model.
+
+    python bench.py padding      # length bucketing vs. one padded batch
+    python bench.py compile      # eager vs. compiled model latency
+    python bench.py precision    # int8 / bf16 accuracy, latency and size vs. fp32
+    python bench.py backends     # same inputs through every inference backend
+    python bench.py overhead     # per-request Python overhead, pipeline vs. lean path
+    python bench.py load         # concurrent HTTP load test (offline stub model by default)
+
+Every benchmark imports app.py, so it runs against exactly the model and
+pipeline the web server uses.
+"""
+import argparse
+import http.client
+import json
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import app
+
+# ==================== SYMPTOM CORPUS ====================
+# The five "Quick Examples" from the Predict page
+EXAMPLE_SYMPTOMS = [
+    'I have high fever for 3 days, severe headache, muscle pain, weakness and dry cough',
+    'Runny nose, continuous sneezing, watery eyes, itchy throat and mild fever',
+    'Excessive thirst, frequent urination, extreme fatigue, blurred vision and unexplained weight loss',
+    'Severe chest pain, heavy sweating, shortness of breath, pain radiating to left arm and jaw',
+    'Difficulty breathing, wheezing sound when exhaling, chest tightness and shortness of breath',
+]
+
+HISTORY_FILLER = [
+    'The patient reports that the symptoms started gradually over the past two weeks.',
+    'There is no known history of similar episodes in the family.',
+    'Over-the-counter painkillers gave only short relief.',
+    'Sleep has been poor and appetite is reduced.',
+    'The patient recently travelled and was in contact with a sick relative.',
+    'Symptoms are worse in the evening and after physical activity.',
+    'No known drug allergies. Currently not taking any regular medication.',
+]
+
+def short_text(rng):
+    """
+    A short symptom list: a few comma separated symptoms from the examples
+    """
+    symptoms = [s.strip() for text in EXAMPLE_SYMPTOMS for s in text.replace(' and ', ', ').split(',')]
+    return ', '.join(rng.sample(symptoms, rng.randint(2, 5)))
+
+def long_text(rng, sentences=20):
+    """
+    A long free-text history: an example plus many narrative sentences
+    """
+    parts = [rng.choice(EXAMPLE_SYMPTOMS) + '.']
+    parts += [rng.choice(HISTORY_FILLER) for _ in range(sentences)]
+    return ' '.join(parts)
+
+def mixed_corpus(size, long_fraction=0.1, seed=0):
+    """
+    Mostly short symptom lists with some long histories, shuffled, the
+    way real traffic mixes them
+    """
+    rng = random.Random(seed)
+    return [long_text(rng) if rng.random() < long_fraction else short_text(rng) for _ in range(size)]
+
+def require_model():
+    if not app.model_loaded and not app.load_model():
+        raise SystemExit("❌ Model not loaded - benchmarks need the real model")
+
+# ==================== PADDING ====================
+def run_padding(args):
+    """
+    Score the same mixed corpus with and without length bucketing and
+    compare tokens processed per second
+    """
+    require_model()
+    corpus = mixed_corpus(args.size, args.long_fraction)
+    batches = [corpus[i:i + args.batch_size] for i in range(0, len(corpus), args.batch_size)]
+    lengths = [app.token_lengths(batch) for batch in batches]
+    real_tokens = sum(sum(l) for l in lengths)
+
+    print(f"Corpus: {len(corpus)} texts, {real_tokens} tokens, batch size {args.batch_size}")
+    app.predict_diseases(batches[0])   # warm up
+
+    results = {}
+    for bucketing in (False, True):
+        app.BUCKETING = bucketing
+        if bucketing:
+            padded = sum(max(l[i] for i in group) * len(group)
+                         for l in lengths for group in app.bucket_by_length(l))
+        else:
+            padded = sum(max(l) * len(l) for l in lengths)
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for batch in batches:
+                app.predict_diseases(batch)
+        elapsed = (time.perf_counter() - started) / args.repeat
+
+        name = 'bucketed' if bucketing else 'single batch'
+        results[name] = real_tokens / elapsed
+        print(f"{name:<14} {elapsed:8.3f} s   {real_tokens / elapsed:10.1f} real tokens/s   "
+              f"padding overhead {100 * (padded - real_tokens) / padded:5.1f}%")
+
+    print(f"\nSpeed-up from bucketing: {results['bucketed'] / results['single batch']:.2f}x")
+
+# ==================== COMPILE ====================
+def measure_shapes(lengths, batch_sizes, repeat):
+    """
+    {(batch_size, length): (first call seconds, median seconds)}
+    """
+    results = {}
+    for batch_size in batch_sizes:
+        for length in lengths:
+            texts = app.warmup_texts(length, batch_size)
+            started = time.perf_counter()
+            app.predict_diseases(texts)
+            first = time.perf_counter() - started
+
+            times = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                app.predict_diseases(texts)
+                times.append(time.perf_counter() - started)
+            results[(batch_size, length)] = (first, sorted(times)[len(times) // 2])
+    return results
+
+def run_compile(args):
+    """
+    Latency of the eager model vs. the compiled one for every warm-up shape.
+    "first" is the first call at that shape - what the first requests after
+    a deploy pay - and "median" is steady state.
+    """
+    require_model()
+    lengths = app.WARMUP_LENGTHS
+    batch_sizes = (1, args.batch_size)
+
+    eager = measure_shapes(lengths, batch_sizes, args.repeat)
+
+    started = time.perf_counter()
+    app.compile_model(args.mode)
+    compile_seconds = time.perf_counter() - started
+    compiled = measure_shapes(lengths, batch_sizes, args.repeat)
+
+    print(f"\nCompile mode: {args.mode} (setup {compile_seconds:.1f}s, graph capture happens on first calls)")
+    print(f"{'batch':>5} {'tokens':>6} | {'eager first':>11} {'eager med':>10} | "
+          f"{'comp first':>10} {'comp med':>9} | {'speed-up':>8}")
+    for shape in eager:
+        e_first, e_med = eager[shape]
+        c_first, c_med = compiled[shape]
+        print(f"{shape[0]:>5} {shape[1]:>6} | {e_first * 1000:>9.1f}ms {e_med * 1000:>8.1f}ms | "
+              f"{c_first * 1000:>8.1f}ms {c_med * 1000:>7.1f}ms | {e_med / c_med:>7.2f}x")
+
+    e_total = sum(m for _, m in eager.values())
+    c_total = sum(m for _, m in compiled.values())
+    print(f"\nSteady state, all shapes: eager {e_total * 1000:.0f} ms, compiled {c_total * 1000:.0f} ms "
+          f"({e_total / c_total:.2f}x)")
+
+# ==================== PRECISION ====================
+def reference_set(size):
+    """
+    The UI examples plus a fixed mix of short and long symptom texts
+    """
+    return EXAMPLE_SYMPTOMS + mixed_corpus(size, long_fraction=0.2, seed=1)
+
+def model_megabytes(module):
+    import io
+    import torch
+    buffer = io.BytesIO()
+    torch.save(module.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+def score_reference(texts):
+    """
+    Top 5 from predict_disease for every text, plus median latency per text
+    """
+    outputs = []
+    times = []
+    for text in texts:
+        started = time.perf_counter()
+        outputs.append(app.predict_disease(text))
+        times.append(time.perf_counter() - started)
+    return outputs, sorted(times)[len(times) // 2]
+
+def run_precision(args):
+    """
+    Accuracy harness: every reduced-precision mode against fp32 on the same
+    reference set. Prints each disagreement, then a summary table.
+    """
+    require_model()
+    texts = reference_set(args.size)
+    fp32_model = app.clf.model
+
+    app.predict_disease(texts[0])   # warm up
+    reference, fp32_latency = score_reference(texts)
+    fp32_mb = model_megabytes(fp32_model)
+
+    summary = [('fp32', len(texts), len(texts), 0.0, fp32_latency, fp32_mb)]
+    for mode in args.modes:
+        if mode == 'fp32':
+            continue
+        app.clf.model = fp32_model
+        try:
+            reduced = app.apply_precision(mode)
+        except RuntimeError as e:
+            print(f"⚠️  Skipping {mode}: {e}")
+            continue
+
+        app.predict_disease(texts[0])
+        outputs, latency = score_reference(texts)
+
+        top1_agree = 0
+        top5_agree = 0
+        max_diff = 0.0
+        print(f"\n---------- {mode} vs fp32 ----------")
+        for text, want, got in zip(texts, reference, outputs):
+            want_names = [p['disease'] for p in want['predictions']]
+            got_names = [p['disease'] for p in got['predictions']]
+            top1_agree += want_names[0] == got_names[0]
+            top5_agree += want_names == got_names
+            for w in want['predictions']:
+                for g in got['predictions']:
+                    if g['disease'] == w['disease']:
+                        max_diff = max(max_diff, abs(g['confidence'] - w['confidence']))
+            if want_names != got_names:
+                marker = 'TOP-1' if want_names[0] != got_names[0] else 'order'
+                print(f"[{marker}] {text[:60]!r}")
+                print(f"    fp32: {', '.join(want_names)}")
+                print(f"    {mode}: {', '.join(got_names)}")
+
+        summary.append((mode, top1_agree, top5_agree, max_diff, latency, model_megabytes(reduced)))
+
+    app.clf.model = fp32_model
+
+    print(f"\n{'mode':<6} {'top-1 agree':>12} {'top-5 agree':>12} {'max Δconf':>10} "
+          f"{'latency':>9} {'saved':>7} {'size':>9} {'saved':>7}")
+    for mode, top1, top5, diff, latency, mb in summary:
+        print(f"{mode:<6} {top1:>6}/{len(texts):<5} {top5:>6}/{len(texts):<5} {diff:>10.4f} "
+              f"{latency * 1000:>7.1f}ms {100 * (1 - latency / fp32_latency):>6.1f}% "
+              f"{mb:>7.1f}MB {100 * (1 - mb / fp32_mb):>6.1f}%")
+
+# ==================== BACKENDS ====================
+def run_backends(args):
+    """
+    Run the same batches through every backend, compare their top k with
+    the first backend and time them
+    """
+    require_model()
+    texts = reference_set(args.size)
+    batches = [texts[i:i + args.batch_size] for i in range(0, len(texts), args.batch_size)]
+
+    outputs = {}
+    timings = {}
+    for name in args.backends:
+        try:
+            backend = app.make_backend(name)
+        except ImportError as e:
+            print(f"⚠️  Skipping {name}: {e}")
+            continue
+
+        backend.predict(batches[0], args.k)   # warm up
+        results = []
+        started = time.perf_counter()
+        for batch in batches:
+            results.extend(backend.predict(batch, args.k))
+        timings[name] = time.perf_counter() - started
+        outputs[name] = results
+
+    names = list(outputs)
+    reference = names[0]
+    print(f"\n{len(texts)} texts, batch size {args.batch_size}, top {args.k}, reference: {reference}")
+    print(f"{'backend':<10} {'total':>9} {'per text':>9} {'top-1 agree':>12} {'top-k agree':>12} {'max Δscore':>11}")
+    for name in names:
+        top1 = topk = 0
+        max_diff = 0.0
+        for want, got in zip(outputs[reference], outputs[name]):
+            top1 += want[0][0] == got[0][0]
+            topk += [label for label, _ in want] == [label for label, _ in got]
+            got_scores = dict(got)
+            for label, score in want:
+                if label in got_scores:
+                    max_diff = max(max_diff, abs(score - got_scores[label]))
+        print(f"{name:<10} {timings[name]:>8.2f}s {1000 * timings[name] / len(texts):>7.2f}ms "
+              f"{top1:>6}/{len(texts):<5} {topk:>6}/{len(texts):<5} {max_diff:>11.2e}")
+
+# ==================== OVERHEAD ====================
+def median_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return sorted(times)[len(times) // 2]
+
+def run_overhead(args):
+    """
+    Per-request time of predict_disease split into tokenization, the model
+    forward pass and everything else (Python overhead), for the pipeline
+    path and the lean path
+    """
+    import torch
+    require_model()
+
+    text = EXAMPLE_SYMPTOMS[0]
+    encoded = app.tokenizer([text], padding=True, truncation=True, return_tensors='pt')
+
+    def forward():
+        with torch.inference_mode():
+            app.clf.model(**encoded)
+
+    tokenize = median_time(lambda: app.tokenizer([text], padding=True, truncation=True, return_tensors='pt'),
+                           args.repeat)
+    model_time = median_time(forward, args.repeat)
+
+    print(f"Single request, {encoded['input_ids'].shape[1]} tokens, median of {args.repeat}")
+    print(f"tokenize {tokenize * 1e6:.0f} µs, forward {model_time * 1e6:.0f} µs\n")
+    print(f"{'path':<10} {'total':>10} {'overhead':>10} {'of total':>9}")
+
+    previous = app.backend
+    overheads = {}
+    try:
+        for name in ('pipeline', 'pytorch'):
+            app.backend = app.make_backend(name)
+            app.predict_disease(text, args.k)
+            total = median_time(lambda: app.predict_disease(text, args.k), args.repeat)
+            overhead = max(0.0, total - tokenize - model_time)
+            overheads[name] = overhead
+            print(f"{name:<10} {total * 1e6:>8.0f}µs {overhead * 1e6:>8.0f}µs {100 * overhead / total:>8.1f}%")
+    finally:
+        app.backend = previous
+
+    if overheads['pytorch'] > 0:
+        print(f"\nPython overhead reduced {overheads['pipeline'] / overheads['pytorch']:.1f}x")
+
+# ==================== LOAD TEST ====================
+BASELINE_FILE = 'bench_baseline.json'
+REGRESSION_TOLERANCE = 0.15   # 15% worse than the baseline counts as a regression (rps, p50)
+TAIL_TOLERANCE = 0.30         # p95 / p99 rest on a few hundred samples per run, so they are noisier
+LOAD_REPEAT = 3               # runs per load test; the median of each metric is compared
+
+def start_stub_server(args):
+    """
+    Start the real Handler on a free port in this process, backed by the
+    stub model. Returns the base URL.
+    """
+    app.STUB_BATCH_MS = args.stub_batch_ms
+    app.STUB_TOKEN_MS = args.stub_token_ms
+    app.load_stub_model()
+    app.batcher = app.MicroBatcher(args.batch_size, args.batch_wait_ms)
+    app.prediction_cache = app.PredictionCache(args.cache_size)
+    app.Handler.log_message = lambda *a: None
+    app.LOG_PREDICTIONS = False
+
+    server = app.HealthServer(('127.0.0.1', 0), app.Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def run_stub_server(args):
+    """
+    Serve the stub model until stdin is closed, i.e. until the load test
+    that started this process exits
+    """
+    print(start_stub_server(args), flush=True)
+    sys.stdin.read()
+
+def spawn_stub_server(args):
+    """
+    start_stub_server in a child process, so the server does not compete
+    with the load generator's threads for this process's GIL. Returns the
+    process and the base URL.
+    """
+    command = [sys.executable, __file__, 'stub-server',
+               '--batch-size', str(args.batch_size), '--batch-wait-ms', str(args.batch_wait_ms),
+               '--cache-size', str(args.cache_size), '--stub-batch-ms', str(args.stub_batch_ms),
+               '--stub-token-ms', str(args.stub_token_ms)]
+    server = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    # The URL is the last line it prints (after the model's own messages)
+    for line in server.stdout:
+        if line.startswith('http'):
+            return server, line.strip()
+    server.kill()
+    raise RuntimeError('stub server did not start')
+
+def client_loop(base_url, texts, seed, stop_at, record_after, samples, errors):
+    """
+    One closed-loop client: send a request, wait for the answer, repeat
+    """
+    url = urlsplit(base_url)
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+
+    while time.perf_counter() < stop_at:
+        body = json.dumps({'symptoms': rng.choice(texts)})
+        started = time.perf_counter()
+        try:
+            conn.request('POST', '/predict', body, {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            ok = False
+        finished = time.perf_counter()
+
+        if started >= record_after:
+            if ok:
+                samples.append(finished - started)
+            else:
+                errors.append(finished)
+    conn.close()
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def compare_to_baseline(result, baseline, tolerance, tail_tolerance):
+    """
+    Print the comparison; returns the list of metrics that regressed
+    """
+    regressions = []
+    print(f"\n{'metric':<8} {'baseline':>10} {'now':>10} {'change':>8} {'allowed':>8}")
+    for metric, higher_is_better, allowed in (('rps', True, tolerance), ('p50_ms', False, tolerance),
+                                              ('p95_ms', False, tail_tolerance),
+                                              ('p99_ms', False, tail_tolerance)):
+        old, new = baseline[metric], result[metric]
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = ''
+        if worse > allowed:
+            flag = '  ❌ regression'
+            regressions.append(metric)
+        print(f"{metric:<8} {old:>10.1f} {new:>10.1f} {100 * change:>7.1f}% {100 * allowed:>7.0f}%{flag}")
+    return regressions
+
+def measure_load(base_url, texts, args, warmup, seed):
+    """
+    One run of args.concurrency closed-loop clients; returns the metrics
+    """
+    samples = []
+    errors = []
+    started = time.perf_counter()
+    record_after = started + warmup
+    stop_at = record_after + args.seconds
+    clients = [threading.Thread(target=client_loop,
+                                args=(base_url, texts, seed + i, stop_at, record_after, samples, errors))
+               for i in range(args.concurrency)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+
+    samples.sort()
+    return {
+        'concurrency': args.concurrency,
+        'requests': len(samples),
+        'errors': len(errors),
+        'rps': len(samples) / args.seconds,
+        'p50_ms': 1000 * percentile(samples, 0.50),
+        'p95_ms': 1000 * percentile(samples, 0.95),
+        'p99_ms': 1000 * percentile(samples, 0.99),
+        'mean_ms': 1000 * sum(samples) / len(samples) if samples else 0.0,
+    }
+
+def run_load(args):
+    """
+    Drive /predict with a fixed number of concurrent clients and report
+    latency percentiles and throughput. Without --url a stub server is
+    started in a child process on the deterministic stub model, so no
+    download is needed. The test is repeated --repeat times and the median
+    of each metric is reported and compared, so one noisy run does not
+    decide the outcome.
+    """
+    server = None
+    if args.url:
+        base_url = args.url
+    else:
+        server, base_url = spawn_stub_server(args)
+    texts = EXAMPLE_SYMPTOMS + [short_text(random.Random(i)) for i in range(args.texts)]
+
+    print(f"🚦 {args.concurrency} clients -> {base_url}/predict, {args.repeat} x {args.seconds:g}s "
+          f"(+{args.warmup:g}s warm-up)")
+
+    runs = []
+    try:
+        for run in range(args.repeat):
+            # Only the first run needs the server warmed up
+            runs.append(measure_load(base_url, texts, args, args.warmup if run == 0 else 0.0,
+                                     run * args.concurrency))
+            result = runs[-1]
+            print(f"  run {run + 1}: {result['rps']:.1f} req/s   p50 {result['p50_ms']:.1f} ms   "
+                  f"p95 {result['p95_ms']:.1f} ms   p99 {result['p99_ms']:.1f} ms   errors {result['errors']}")
+    finally:
+        if server:
+            server.stdin.close()
+            server.wait()
+
+    result = {
+        'concurrency': args.concurrency,
+        'repeat': args.repeat,
+        'requests': sum(run['requests'] for run in runs),
+        'errors': sum(run['errors'] for run in runs),
+    }
+    for metric in ('rps', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'):
+        result[metric] = statistics.median(run[metric] for run in runs)
+
+    print(f"\nmedian of {args.repeat}: {result['rps']:.1f} req/s   errors {result['errors']}")
+    print(f"latency  p50 {result['p50_ms']:.1f} ms   p95 {result['p95_ms']:.1f} ms   "
+          f"p99 {result['p99_ms']:.1f} ms   mean {result['mean_ms']:.1f} ms")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.baseline}")
+        return
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"\n(no baseline at {args.baseline} - run with --save-baseline to create one)")
+        return
+
+    if baseline.get('concurrency') != args.concurrency:
+        print(f"\n⚠️  Baseline was measured with {baseline.get('concurrency')} clients, not {args.concurrency}")
+    regressions = compare_to_baseline(result, baseline, args.tolerance, args.tail_tolerance)
+    if regressions or result['errors']:
+        print(f"\n❌ Regressed: {', '.join(regressions) or 'errors'}")
+        sys.exit(1)
+    print("\n✅ Within tolerance of the baseline")
+
+def main():
+    parser = argparse.ArgumentParser(description='Disease model benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    padding = commands.add_parser('padding', help='length bucketing vs. padding the whole batch')
+    padding.add_argument('--size', type=int, default=512, help='texts in the corpus')
+    padding.add_argument('--long-fraction', type=float, default=0.1, help='share of long histories')
+    padding.add_argument('--batch-size', type=int, default=16)
+    padding.add_argument('--repeat', type=int, default=3)
+    padding.set_defaults(run=run_padding)
+
+    compile_ = commands.add_parser('compile', help='eager vs. compiled model latency')
+    compile_.add_argument('--mode', choices=app.COMPILE_MODES, default='torch')
+    compile_.add_argument('--batch-size', type=int, default=app.BATCH_MAX_SIZE)
+    compile_.add_argument('--repeat', type=int, default=5)
+    compile_.set_defaults(run=run_compile)
+
+    precision = commands.add_parser('precision', help='reduced precision accuracy vs. fp32')
+    precision.add_argument('--modes', nargs='+', choices=app.PRECISION_MODES, default=['int8', 'bf16'])
+    precision.add_argument('--size', type=int, default=200, help='texts in the reference set')
+    precision.set_defaults(run=run_precision)
+
+    backends = commands.add_parser('backends', help='compare every inference backend on the same inputs')
+    backends.add_argument('--backends', nargs='+', choices=tuple(app.BACKENDS), default=list(app.BACKENDS))
+    backends.add_argument('--size', type=int, default=200, help='texts in the reference set')
+    backends.add_argument('--batch-size', type=int, default=app.BATCH_MAX_SIZE)
+    backends.add_argument('-k', type=int, default=5)
+    backends.set_defaults(run=run_backends)
+
+    overhead = commands.add_parser('overhead', help='per-request Python overhead, pipeline vs. lean path')
+    overhead.add_argument('--repeat', type=int, default=200)
+    overhead.add_argument('-k', type=int, default=app.DEFAULT_TOP_K)
+    overhead.set_defaults(run=run_overhead)
+
+    load = commands.add_parser('load', help='concurrent HTTP load test against /predict')
+    load.add_argument('--url', help='test a running server instead of a local stub server')
+    load.add_argument('--concurrency', type=int, default=16)
+    load.add_argument('--seconds', type=float, default=10.0, help='length of each run')
+    load.add_argument('--repeat', type=int, default=LOAD_REPEAT, help='runs; the median is compared')
+    load.add_argument('--warmup', type=float, default=2.0, help='seconds of load before recording starts')
+    load.add_argument('--texts', type=int, default=500, help='distinct symptom texts to draw from')
+    load.add_argument('--baseline', default=BASELINE_FILE)
+    load.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    load.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                      help='allowed regression of rps and p50')
+    load.add_argument('--tail-tolerance', type=float, default=TAIL_TOLERANCE,
+                      help='allowed regression of p95 and p99')
+    load.set_defaults(run=run_load)
+
+    # Started by `load` in a child process; not meant to be run by hand
+    stub_server = commands.add_parser('stub-server')
+    stub_server.set_defaults(run=run_stub_server)
+    for parser_ in (load, stub_server):
+        parser_.add_argument('--batch-size', type=int, default=app.BATCH_MAX_SIZE)
+        parser_.add_argument('--batch-wait-ms', type=float, default=app.BATCH_MAX_WAIT_MS)
+        parser_.add_argument('--cache-size', type=int, default=0, help='stub server cache (off by default)')
+        parser_.add_argument('--stub-batch-ms', type=float, default=app.STUB_BATCH_MS)
+        parser_.add_argument('--stub-token-ms', type=float, default=app.STUB_TOKEN_MS)
+
+    args = parser.parse_args()
+    args.run(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Offline bulk scoring - runs the same model as the web server over a CSV or
+JSONL file of symptom texts, without going through HTTP.
+
+    python score.py notes.csv -o scored.jsonl --column symptoms --workers 4
+
+Rows are read in blocks, sorted by length inside each block so similar-length
+texts share a batch (less padding), scored across a pool of worker processes
+and written out in input order. After every block a checkpoint is saved next
+to the output file; running the same command again resumes from there.
+An existing output file without a checkpoint is never overwritten unless
+--restart is given.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import app
+
+BLOCK_SIZE = 4096     # rows read, sorted and checkpointed together
+BATCH_SIZE = 32       # texts per forward pass
+
+# ==================== INPUT ====================
+def read_rows(path, column, id_column=None):
+    """
+    Yield (row_id, text) from a CSV (by column name) or JSONL (by field name)
+    """
+    if path.endswith('.jsonl') or path.endswith('.ndjson'):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if isinstance(record, str):
+                    yield None, record
+                else:
+                    yield record.get(id_column) if id_column else None, str(record.get(column) or '')
+    else:
+        csv.field_size_limit(sys.maxsize)
+        with open(path, encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            if column not in (reader.fieldnames or []):
+                raise SystemExit(f"❌ Column '{column}' not found in {path} (have: {reader.fieldnames})")
+            for record in reader:
+                yield record.get(id_column) if id_column else None, record[column] or ''
+
+def read_blocks(rows, size):
+    block = []
+    for row in rows:
+        block.append(row)
+        if len(block) >= size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+# ==================== CHECKPOINTS ====================
+def load_checkpoint(path, input_path):
+    if not os.path.exists(path):
+        return {'rows_done': 0, 'output_bytes': 0}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('input') != os.path.abspath(input_path):
+        raise SystemExit(f"❌ Checkpoint {path} belongs to {checkpoint.get('input')}, not {input_path}")
+    return checkpoint
+
+def save_checkpoint(path, input_path, rows_done, output_bytes):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({
+            'input': os.path.abspath(input_path),
+            'rows_done': rows_done,
+            'output_bytes': output_bytes,
+            'updated': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+# ==================== SCORING ====================
+def init_worker(threads):
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+
+def score_batch(texts):
+    return app.predict_diseases(texts)
+
+def score_block(block, pool, batch_size):
+    """
+    Score one block. Texts are sorted by length so each batch pads to a
+    similar size; results are put back in input order.
+    """
+    order = sorted(range(len(block)), key=lambda i: len(block[i][1]))
+    batches = [[block[i][1] for i in order[start:start + batch_size]]
+               for start in range(0, len(order), batch_size)]
+
+    if pool is None:
+        scored = map(score_batch, batches)
+    else:
+        scored = pool.imap(score_batch, batches)
+
+    results = [None] * len(block)
+    position = 0
+    for batch_results in scored:
+        for result in batch_results:
+            results[order[position]] = result
+            position += 1
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a CSV/JSONL file of symptom texts offline')
+    parser.add_argument('input', help='.csv, or .jsonl/.ndjson with one record per line')
+    parser.add_argument('-o', '--output', required=True, help='JSONL file to write results to')
+    parser.add_argument('--column', default='symptoms', help='CSV column / JSON field holding the text')
+    parser.add_argument('--id-column', help='optional column / field copied to the output as "id"')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes sharing the model')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE)
+    parser.add_argument('--restart', action='store_true', help='ignore any checkpoint, overwrite the output and start over')
+    args = parser.parse_args()
+
+    checkpoint_path = args.output + '.checkpoint'
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    elif not os.path.exists(checkpoint_path) and os.path.exists(args.output) and os.path.getsize(args.output):
+        # Without a checkpoint there is nothing to resume, and starting over
+        # would truncate somebody's results
+        raise SystemExit(f"❌ {args.output} already exists and has no checkpoint - pass --restart to overwrite it")
+    checkpoint = load_checkpoint(checkpoint_path, args.input)
+    rows_done = checkpoint['rows_done']
+
+    if not app.model_loaded and not app.load_model():
+        raise SystemExit("❌ Model not loaded - cannot score")
+
+    # Drop anything written after the last checkpoint (a half-finished block)
+    out = open(args.output, 'a+b')
+    out.truncate(checkpoint['output_bytes'])
+    out.seek(0, os.SEEK_END)
+
+    if rows_done:
+        print(f"↩️  Resuming after {rows_done} rows")
+
+    pool = None
+    if args.workers > 1:
+        import multiprocessing
+        threads = max(1, (os.cpu_count() or 1) // args.workers)
+        # fork, so the workers share the already-loaded model copy-on-write
+        pool = multiprocessing.get_context('fork').Pool(args.workers, init_worker, (threads,))
+
+    rows = read_rows(args.input, args.column, args.id_column)
+    for _ in range(rows_done):
+        next(rows, None)
+
+    started = time.time()
+    scored = 0
+    try:
+        for block in read_blocks(rows, args.block_size):
+            results = score_block(block, pool, args.batch_size)
+
+            lines = []
+            for offset, ((row_id, _), result) in enumerate(zip(block, results)):
+                record = {'row': rows_done + offset}
+                if row_id is not None:
+                    record['id'] = row_id
+                record.update(result)
+                lines.append(json.dumps(record))
+            out.write(('\n'.join(lines) + '\n').encode())
+            out.flush()
+            os.fsync(out.fileno())
+
+            rows_done += len(block)
+            scored += len(block)
+            save_checkpoint(checkpoint_path, args.input, rows_done, out.tell())
+
+            elapsed = time.time() - started
+            print(f"✅ {rows_done} rows done ({scored / elapsed:.1f} rows/s)")
+    finally:
+        out.close()
+        if pool is not None:
+            pool.terminate()
+
+    print(f"\n🏁 Finished: {rows_done} rows in {args.output}")
+
+if __name__ == '__main__':
+    main()
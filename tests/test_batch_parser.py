@@ -0,0 +1,90 @@
+"""
+iter_batch_texts: the streaming parser behind POST /predict/batch
+"""
+import gzip
+import io
+import json
+import time
+
+import pytest
+
+import app
+
+
+def parse(body, read_size=65536, **kwargs):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return list(app.iter_batch_texts(io.BytesIO(body), read_size, **kwargs))
+
+
+TEXTS = ['fever and cough', 'say "ah"', 'back\\slash', 'naïve – ünïcödé', '', '{[not, json]}']
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 3, 5, 7, 64, 65536])
+def test_array_split_at_every_read_boundary(read_size):
+    body = json.dumps([TEXTS[0], {'symptoms': TEXTS[1], 'extra': [1, {'a': ']'}]}] + TEXTS[2:])
+    assert parse(body, read_size) == TEXTS
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 3, 5, 7, 64, 65536])
+def test_ndjson_split_at_every_read_boundary(read_size):
+    body = '\n'.join(json.dumps(t) for t in TEXTS[:3]) + '\n\n' + json.dumps({'symptoms': TEXTS[3]})
+    assert parse(body, read_size) == TEXTS[:4]
+
+
+@pytest.mark.parametrize('read_size', [1, 3, 65536])
+def test_escapes_across_read_boundaries(read_size):
+    text = '\\"\u00e9\U0001F600' * 5
+    body = json.dumps([text, text], ensure_ascii=True)
+    assert parse(body, read_size) == [text, text]
+
+
+def test_leading_whitespace_and_separators():
+    assert parse('  \n\t [ "a" ,, "b" , ]  ') == ['a', 'b']
+    assert parse('\n\n{"symptoms": "a"}\r\n"b"') == ['a', 'b']
+    assert parse('') == []
+
+
+@pytest.mark.parametrize('body', ['["a", "b"', '["a", "b', '["a", {"symptoms": "b"', '["a" 1]', '[1]', '{"symptoms": 1}'])
+def test_malformed_bodies_raise_value_error(body):
+    with pytest.raises(ValueError):
+        parse(body, 2)
+
+
+def test_item_at_the_limit_parses():
+    text = 'x' * app.MAX_INPUT_CHARS
+    assert parse(json.dumps([text, 'ok']), 4096) == [text, 'ok']
+    assert parse(json.dumps({'symptoms': text}) + '\n"ok"', 4096) == [text, 'ok']
+
+
+@pytest.mark.parametrize('ndjson', [False, True])
+def test_oversized_item_fails_before_it_is_buffered(ndjson):
+    huge = 'x' * (64 * 1024 * 1024)
+    body = (json.dumps(huge) + '\n') if ndjson else json.dumps(['ok', huge])
+    stream = io.BytesIO(body.encode())
+    started = time.perf_counter()
+    with pytest.raises(ValueError, match='longer than'):
+        list(app.iter_batch_texts(stream))
+    assert time.perf_counter() - started < 2
+    # Stopped reading long before the end of the item
+    assert stream.tell() < 4 * app.batch_item_limit()
+
+
+def test_many_items_parse_in_linear_time():
+    body = json.dumps(['fever %d' % i for i in range(200000)])
+    started = time.perf_counter()
+    assert len(parse(body)) == 200000
+    assert time.perf_counter() - started < 5
+
+
+def test_gzip_body():
+    texts = ['text %d' % i for i in range(5000)]
+    body = gzip.compress(json.dumps(texts).encode())
+    assert list(app.iter_batch_texts(gzip.GzipFile(fileobj=io.BytesIO(body)), 1000)) == texts
+
+
+def test_gzip_bomb_stops_at_max_bytes():
+    # ~100 MB of blanks compresses to about 100 KB
+    body = gzip.compress(b'[' + b' ' * (100 * 1024 * 1024) + b'"a"]')
+    with pytest.raises(ValueError, match='larger than'):
+        list(app.iter_batch_texts(gzip.GzipFile(fileobj=io.BytesIO(body)), max_bytes=10 * 1024 * 1024))
@@ -0,0 +1,21 @@
+"""
+parse_deadline: the X-Deadline-Ms header
+"""
+import pytest
+
+import app
+
+
+def test_absent_header_means_no_deadline():
+    assert app.parse_deadline(None, 100.0) is None
+
+
+@pytest.mark.parametrize('value, expected', [('0', 100.0), ('250', 100.25), ('1.5', 100.0015)])
+def test_budget_is_added_to_the_receive_time(value, expected):
+    assert app.parse_deadline(value, 100.0) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('value', ['soon', '', 'nan', 'inf', '-inf', '1e400', '-1'])
+def test_rejects_values_that_are_not_finite_and_non_negative(value):
+    with pytest.raises(ValueError):
+        app.parse_deadline(value, 100.0)
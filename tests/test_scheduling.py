@@ -0,0 +1,251 @@
+"""
+Fair scheduling (TokenBucket, FairQueue) and in-flight coalescing in
+PredictionCache
+"""
+import queue
+import threading
+import time
+
+import pytest
+
+import app
+
+
+def drain(fair_queue):
+    items = []
+    while fair_queue.qsize():
+        items.append(fair_queue.get_nowait())
+    return items
+
+
+def wait_until(condition, timeout=5.0):
+    stop = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < stop, 'timed out'
+        time.sleep(0.001)
+
+
+# ---------- TokenBucket ----------
+
+def test_try_take_refuses_without_going_into_debt():
+    bucket = app.TokenBucket(rate=10, burst=2)
+    assert bucket.try_take() == 0
+    assert bucket.try_take() == 0
+    wait = bucket.try_take()
+    assert 0 < wait <= 0.1
+    assert bucket.tokens > -0.01
+
+
+def test_take_runs_into_debt_and_returns_the_wait():
+    bucket = app.TokenBucket(rate=10, burst=5)
+    assert bucket.take(5) == 0
+    # 10 more tokens at 10/s: a second's worth of debt
+    assert bucket.take(10) == pytest.approx(1.0, abs=0.05)
+    # Debt is paid off before anything else is allowed
+    assert bucket.try_take() == pytest.approx(1.1, abs=0.05)
+
+
+# ---------- FairQueue ----------
+
+def test_weighted_clients_share_by_weight():
+    heavy = app.Client('heavy', 'bulk', weight=3)
+    light = app.Client('light', 'bulk', weight=1)
+    fair_queue = app.FairQueue(100)
+    for i in range(8):
+        fair_queue.put(('heavy', i), heavy)
+    for i in range(8):
+        fair_queue.put(('light', i), light)
+
+    first = [name for name, _ in drain(fair_queue)[:8]]
+    assert first.count('heavy') == 6
+    assert first.count('light') == 2
+
+
+def test_backlog_does_not_crowd_out_another_client():
+    busy = app.Client('busy', 'bulk')
+    quiet = app.Client('quiet', 'bulk')
+    fair_queue = app.FairQueue(100)
+    for i in range(10):
+        fair_queue.put(('busy', i), busy)
+    fair_queue.put(('quiet', 0), quiet)
+
+    assert drain(fair_queue)[:2] == [('busy', 0), ('quiet', 0)]
+
+
+def test_cost_counts_against_the_client():
+    big = app.Client('big', 'bulk')
+    small = app.Client('small', 'bulk')
+    fair_queue = app.FairQueue(100)
+    fair_queue.put('big batch', big, cost=8)
+    fair_queue.put('small 1', small, cost=1)
+    fair_queue.put('small 2', small, cost=1)
+
+    assert drain(fair_queue) == ['small 1', 'small 2', 'big batch']
+
+
+def test_interactive_before_bulk():
+    bulk = app.Client('batch job', 'bulk', weight=100)
+    interactive = app.Client('web', 'interactive')
+    fair_queue = app.FairQueue(100)
+    fair_queue.put('bulk 1', bulk)
+    fair_queue.put('bulk 2', bulk)
+    fair_queue.put('interactive', interactive)
+
+    assert drain(fair_queue) == ['interactive', 'bulk 1', 'bulk 2']
+
+
+def test_queued_texts_are_counted_per_client():
+    client = app.Client('counted', 'bulk')
+    fair_queue = app.FairQueue(100)
+    fair_queue.put('a', client, cost=3)
+    fair_queue.put('b', client, cost=2)
+    assert (fair_queue.qsize(), client.queued) == (5, 5)
+    fair_queue.get_nowait()
+    assert (fair_queue.qsize(), client.queued) == (2, 2)
+
+
+def test_put_times_out_with_queue_full():
+    client = app.Client('filler', 'bulk')
+    fair_queue = app.FairQueue(2)
+    fair_queue.put('a', client)
+    fair_queue.put('b', client)
+
+    started = time.monotonic()
+    with pytest.raises(queue.Full):
+        fair_queue.put('c', client, timeout=0.05)
+    assert time.monotonic() - started >= 0.05
+    with pytest.raises(queue.Full):
+        fair_queue.put_nowait('c', client)
+    assert fair_queue.qsize() == 2
+
+
+def test_put_waits_for_room():
+    client = app.Client('waiter', 'bulk')
+    fair_queue = app.FairQueue(1)
+    fair_queue.put('a', client)
+    threading.Timer(0.05, fair_queue.get_nowait).start()
+
+    fair_queue.put('b', client, timeout=5)
+    assert drain(fair_queue) == ['b']
+
+
+def test_one_oversized_item_fits_an_empty_queue():
+    client = app.Client('oversized', 'bulk')
+    fair_queue = app.FairQueue(4)
+    fair_queue.put_nowait('huge', client, cost=10)
+    with pytest.raises(queue.Full):
+        fair_queue.put_nowait('small', client, cost=1)
+    assert fair_queue.get_nowait() == 'huge'
+    fair_queue.put_nowait('small', client, cost=1)
+
+
+def test_get_times_out_with_queue_empty():
+    with pytest.raises(queue.Empty):
+        app.FairQueue(4).get(timeout=0.01)
+
+
+# ---------- PredictionCache coalescing ----------
+
+class SlowCompute:
+    """
+    compute() for PredictionCache.predict that blocks until released
+    """
+    def __init__(self, result=None, error=None):
+        self.result = result or {'predictions': [{'disease': 'Flu', 'confidence': 0.9}]}
+        self.error = error
+        self.release = threading.Event()
+        self.calls = 0
+
+    def __call__(self, text, k):
+        self.calls += 1
+        assert self.release.wait(5)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def in_thread(fn, *args, **kwargs):
+    outcome = {}
+    def run():
+        try:
+            outcome['result'] = fn(*args, **kwargs)
+        except Exception as e:
+            outcome['error'] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def test_follower_shares_the_owners_result():
+    cache = app.PredictionCache(10)
+    owner = SlowCompute()
+    follower = SlowCompute(result={'predictions': []})
+    owner_thread, owner_outcome = in_thread(cache.predict, 'fever', owner, 5, None, 'bulk')
+    wait_until(lambda: owner.calls == 1)
+    follower_thread, follower_outcome = in_thread(cache.predict, '  fever ', follower, 5, None, 'bulk')
+    wait_until(lambda: cache.stats()['coalesced'] == 1)
+
+    owner.release.set()
+    owner_thread.join()
+    follower_thread.join()
+    assert follower_outcome['result'] is owner_outcome['result'] is owner.result
+    assert follower.calls == 0
+    assert cache.stats()['inflight'] == 0
+
+
+def test_follower_gives_up_at_its_own_deadline():
+    cache = app.PredictionCache(10)
+    owner = SlowCompute()
+    owner_thread, owner_outcome = in_thread(cache.predict, 'cough', owner, 5, None, 'bulk')
+    wait_until(lambda: owner.calls == 1)
+
+    with pytest.raises(app.DeadlineExceeded):
+        cache.predict('cough', SlowCompute(), 5, time.monotonic() + 0.05, 'bulk')
+    owner.release.set()
+    owner_thread.join()
+    assert owner_outcome['result'] is owner.result
+
+
+def test_follower_computes_itself_when_the_owners_deadline_passes():
+    cache = app.PredictionCache(10)
+    owner = SlowCompute(error=app.DeadlineExceeded('owner ran out of time'))
+    follower = SlowCompute(result={'predictions': [{'disease': 'Cold', 'confidence': 0.5}]})
+    follower.release.set()
+    owner_thread, owner_outcome = in_thread(cache.predict, 'sneezing', owner, 5, None, 'bulk')
+    wait_until(lambda: owner.calls == 1)
+    follower_thread, follower_outcome = in_thread(cache.predict, 'sneezing', follower, 5, None, 'bulk')
+    wait_until(lambda: cache.stats()['coalesced'] == 1)
+
+    owner.release.set()
+    owner_thread.join()
+    follower_thread.join()
+    assert isinstance(owner_outcome['error'], app.DeadlineExceeded)
+    assert follower_outcome['result'] is follower.result
+    assert follower.calls == 1
+
+
+def test_followers_only_wait_behind_their_own_class():
+    cache = app.PredictionCache(10)
+    bulk = SlowCompute()
+    interactive = SlowCompute()
+    interactive.release.set()
+    bulk_thread, _ = in_thread(cache.predict, 'rash', bulk, 5, None, 'bulk')
+    wait_until(lambda: bulk.calls == 1)
+
+    assert cache.predict('rash', interactive, 5, None, 'interactive') is interactive.result
+    assert cache.stats()['coalesced'] == 0
+    bulk.release.set()
+    bulk_thread.join()
+
+
+def test_errors_are_shared_but_not_cached():
+    cache = app.PredictionCache(10)
+    failing = SlowCompute(error=RuntimeError('model exploded'))
+    failing.release.set()
+    assert cache.predict('itching', failing, 5) == {'error': 'model exploded'}
+
+    working = SlowCompute()
+    working.release.set()
+    assert cache.predict('itching', working, 5) is working.result
+    assert cache.predict('itching', failing, 5) is working.result
+    assert cache.stats()['hits'] == 1